@@ -1,7 +1,12 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Any, Dict, Optional
 
+# 网络重试耗尽时 ConnectionError 信息中的固定片段，调用方据此识别需要降速的失败
+NETWORK_FAILURE_MARK = "网络连续失败"
+
+
 class BusinessLogicError(Exception):
     """当服务器返回 status: false 时抛出此异常。"""
     pass
@@ -19,6 +24,7 @@ class BaseAction:
             cookie: Optional[Dict[str, str]] = None,
             max_retries: int = 3,
             timeout: int = 8,
+            adapter: Optional[HTTPAdapter] = None,
     ):
         """
         初始化一个操作实例。
@@ -28,6 +34,7 @@ class BaseAction:
         :param base_url: 该操作模块对应的基础 URL。
         :param max_retries: 单次请求的最大重试次数。
         :param timeout: 请求超时时间（秒）。
+        :param adapter: 可选的共享 HTTPAdapter；批量处理多个账号时传入同一个，复用长连接池。
         """
         if not key or not cookie:
             raise ValueError("必须提供有效的 key 和 cookie。")
@@ -49,6 +56,23 @@ class BaseAction:
         if self.cookie:
             self.http_client.cookies.update(self.cookie)
 
+        # Session 保存各账号自己的 cookie，不能跨账号共享；共享的只是底层连接池
+        if adapter is not None:
+            self.http_client.mount("http://", adapter)
+            self.http_client.mount("https://", adapter)
+
+    def set_credentials(self, key: str, cookie: Optional[Dict[str, str]]):
+        """
+        切换到另一个账号的 key 和 cookie，复用当前实例的 Session 与连接池。
+        批量处理多个账号时，工作线程可用同一个操作实例依次处理各账号。
+        """
+        if not key or not cookie:
+            raise ValueError("必须提供有效的 key 和 cookie。")
+        self.key = key
+        self.cookie = cookie
+        self.http_client.cookies.clear()
+        self.http_client.cookies.update(cookie)
+
     def _request(self, method: str, url: str, **kwargs: Any) -> Any:
         """
         私有的通用请求方法。现在只对网络错误进行重试。
@@ -72,7 +96,7 @@ class BaseAction:
                 last_exception = e
                 time.sleep(1)
 
-        raise ConnectionError(f"接口 {url} 网络连续失败 {self.max_retries} 次后放弃。最后一次错误: {last_exception}")
+        raise ConnectionError(f"接口 {url} {NETWORK_FAILURE_MARK} {self.max_retries} 次后放弃。最后一次错误: {last_exception}")
 
     def post(self, action_path: str, data: Optional[Dict[str, Any]] = None) -> Any:
         """发送 POST 请求。action_path 可以是 'a=action' 或 'm=Module&a=action'。"""
@@ -4,6 +4,7 @@ import time
 from dotenv import load_dotenv
 from src.delicious_town_bot.actions.base_action import BaseAction, BusinessLogicError
 from typing import Tuple, Dict, Any, Union, Optional, List
+from requests.adapters import HTTPAdapter
 
 # 导入 CaptchaSolver 类
 from src.delicious_town_bot.utils.captcha_solver import CaptchaSolver
@@ -12,9 +13,9 @@ from src.delicious_town_bot.utils.captcha_solver import CaptchaSolver
 class FoodActions(BaseAction):
     """封装所有与菜市场（Food）相关的游戏操作。"""
 
-    def __init__(self, key: str, cookie: Optional[Dict[str, str]] = None):
+    def __init__(self, key: str, cookie: Optional[Dict[str, str]] = None, adapter: Optional[HTTPAdapter] = None):
         base_url = "http://117.72.123.195/index.php?g=Res&m=Food"
-        super().__init__(key, base_url, cookie)
+        super().__init__(key, base_url, cookie, adapter=adapter)
 
     def get_food_list(self) -> Optional[List[Dict[str, Any]]]:
         """
@@ -227,6 +228,8 @@ class FoodActions(BaseAction):
                 error_msg = str(e)
                 if "验证码错误" in error_msg:
                     print(f"[Warn] 验证码错误，准备重试...")
+                    # 识别结果错误：从共享缓存中移除，避免之后再次复用
+                    solver.report_wrong()
                     time.sleep(2)
                 elif "已卖完" in error_msg or "已售罄" in error_msg:
                     print(f"[Info] 特价菜 '{item_name}' 已售罄，放弃购买。")
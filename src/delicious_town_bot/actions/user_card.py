@@ -4,6 +4,7 @@
 """
 import re
 from typing import Dict, Any, Optional, List
+from requests.adapters import HTTPAdapter
 from src.delicious_town_bot.actions.base_action import BaseAction, BusinessLogicError
 
 
@@ -12,9 +13,9 @@ class UserCardAction(BaseAction):
     用户卡片信息操作类，获取用户餐厅详细信息
     """
 
-    def __init__(self, key: str, cookie: Optional[Dict[str, str]] = None):
+    def __init__(self, key: str, cookie: Optional[Dict[str, str]] = None, adapter: Optional[HTTPAdapter] = None):
         base_url = "http://117.72.123.195/index.php?g=Res"
-        super().__init__(key=key, cookie=cookie, base_url=base_url)
+        super().__init__(key=key, cookie=cookie, base_url=base_url, adapter=adapter)
         # 更新 Referer
         self.http_client.headers.update({
             'Referer': 'http://117.72.123.195/wap/res/user_card.html'
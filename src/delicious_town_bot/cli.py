@@ -2,6 +2,7 @@ import typer
 from typing import Optional
 
 from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.log_setup import setup_logging
 
 app = typer.Typer(help="Delicious Town Bot CLI")
 
@@ -93,4 +94,5 @@ def refresh_key(
 
 
 if __name__ == "__main__":
+    setup_logging()
     app()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Date
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Date, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from src.delicious_town_bot.db.session import Base, init_db
 
@@ -19,6 +19,12 @@ class Account(Base):
 
 class FriendCache(Base):
     __tablename__ = 'friend_cache'
+    # 按账号+更新时间查询/清理缓存时走索引范围扫描，避免全表扫描
+    __table_args__ = (
+        Index('ix_friendcache_account_updated', 'account_id', 'last_updated'),
+        # 每个账号的每个好友只有一条缓存，更新缓存时按此约束 UPSERT
+        UniqueConstraint('account_id', 'friend_id', name='uq_friendcache_acc_friend'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     account_id = Column(Integer, ForeignKey('accounts.id'), nullable=False)
@@ -37,6 +43,10 @@ class FriendCache(Base):
 
 class SpecialFoodTask(Base):
     __tablename__ = 'special_food_tasks'
+    # 每个账号每天只有一条任务记录，标记完成/失败时按此约束 UPSERT
+    __table_args__ = (
+        UniqueConstraint('account_id', 'task_date', name='uq_specialfood_acc_date'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     account_id = Column(Integer, ForeignKey('accounts.id'), nullable=False)
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 from dotenv import load_dotenv
 
@@ -31,11 +31,19 @@ if DB_URL.startswith("sqlite"):
     if dirpath and not os.path.exists(dirpath):
         os.makedirs(dirpath, exist_ok=True)
 
+# 连接池参数：复用连接，避免并发刷新时反复建连；内存库使用单连接池，不适用这些参数
+POOL_KWARGS = {} if ":memory:" in DB_URL else {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_pre_ping": True,
+}
+
 # 引擎：sqlite 或其他数据库
 engine = create_engine(
     DB_URL,
     connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
     echo=False,
+    **POOL_KWARGS,
 )
 
 # 会话工厂
@@ -51,6 +59,30 @@ DBSession = scoped_session(SessionLocal)
 Base = declarative_base()
 
 
+def upsert_insert(session):
+    """
+    返回支持 INSERT ... ON CONFLICT 的方言 insert 构造函数（SQLite / PostgreSQL），其他数据库返回 None
+    session 也可以是 Core 的 Connection / Engine
+    """
+    bind = session.get_bind() if hasattr(session, "get_bind") else session
+    name = bind.dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+
+def _has_unique_index(conn, table: str, name: str) -> bool:
+    """表上是否已有指定名称的唯一索引或唯一约束（新建的表由 create_all 按模型建为唯一约束）"""
+    insp = inspect(conn)
+    names = {index["name"] for index in insp.get_indexes(table)}
+    names.update(constraint["name"] for constraint in insp.get_unique_constraints(table))
+    return name in names
+
+
 # 运行时调用，创建所有表
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -59,4 +91,31 @@ def init_db():
         cols = [row['name'] for row in result.mappings()]
         if 'restaurant' not in cols:
             conn.execute(text("ALTER TABLE accounts ADD COLUMN restaurant TEXT"))
+    # create_all 不会给已存在的表补建索引，这里为旧数据库补上
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_friendcache_account_updated "
+            "ON friend_cache (account_id, last_updated)"
+        ))
+        # 唯一索引只需建一次：已存在时跳过，避免每次启动都全表扫描去重
+        if not _has_unique_index(conn, "friend_cache", "uq_friendcache_acc_friend"):
+            # 建唯一索引前先清掉旧数据中重复的 (account_id, friend_id)，只保留最新插入的一条
+            conn.execute(text(
+                "DELETE FROM friend_cache WHERE id NOT IN "
+                "(SELECT MAX(id) FROM friend_cache GROUP BY account_id, friend_id)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_friendcache_acc_friend "
+                "ON friend_cache (account_id, friend_id)"
+            ))
+        # 特价菜任务每个账号每天只有一条记录
+        if not _has_unique_index(conn, "special_food_tasks", "uq_specialfood_acc_date"):
+            conn.execute(text(
+                "DELETE FROM special_food_tasks WHERE id NOT IN "
+                "(SELECT MAX(id) FROM special_food_tasks GROUP BY account_id, task_date)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_specialfood_acc_date "
+                "ON special_food_tasks (account_id, task_date)"
+            ))
     print("✅ 数据库表已创建（或已存在）")
\ No newline at end of file
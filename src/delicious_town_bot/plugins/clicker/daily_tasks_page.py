@@ -532,8 +532,8 @@ class RefreshFriendsCacheWorker(QThread):
             from src.delicious_town_bot.utils.friend_cache_manager import FriendCacheManager
             cache_manager = FriendCacheManager()
             
-            # 调用批量刷新方法
-            results = cache_manager.refresh_all_accounts_friends_cache(self.manager)
+            # 用户手动触发：强制刷新所有账号，不跳过缓存仍有效的账号
+            results = cache_manager.refresh_all_accounts_friends_cache(self.manager, force_refresh=True)
             
             if self.is_cancelled:
                 return
@@ -4822,7 +4822,9 @@ class DailyTasksPage(QWidget):
 if __name__ == "__main__":
     import sys
     from PySide6.QtWidgets import QApplication
+    from src.delicious_town_bot.utils.log_setup import setup_logging
     
+    setup_logging()
     app = QApplication(sys.argv)
     
     # 创建测试用的AccountManager
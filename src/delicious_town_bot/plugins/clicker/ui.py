@@ -11,6 +11,7 @@ from PySide6.QtWidgets import (
 )
 
 from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.log_setup import setup_logging
 from src.delicious_town_bot.utils.depot_manager import DepotManager
 from src.delicious_town_bot.constants import ItemType, Street
 from src.delicious_town_bot.plugins.clicker.game_operations_page import GameOperationsPage
@@ -431,6 +432,7 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    setup_logging()
     app = QApplication(sys.argv)
     win = MainWindow()
     win.show()
@@ -291,6 +291,27 @@ class BatchGiftPackageWorker(QObject):
 
 class VipPage(QWidget):
     """VIP管理页面"""
+
+    # 批量结果对话框模板，只需填入统计数字
+    BATCH_CDK_DONE_TEMPLATE = (
+        "🎉 批量CDK兑换完成！\n\n"
+        "📊 兑换统计:\n"
+        "• 总账号数: {total}\n"
+        "• 成功数量: {success}\n"
+        "• 失败数量: {failure}\n"
+        "• CDK代码: {cdk_code}\n\n"
+        "✨ 详细结果请查看操作日志"
+    )
+    BATCH_VIP_DONE_TEMPLATE = (
+        "🎉 批量VIP购买已完成！\n\n"
+        "📊 购买统计:\n"
+        "• 总账号数: {total}\n"
+        "• 成功数量: {success}\n"
+        "• 失败数量: {failure}\n"
+        "• 单价: {cost} 钻石\n"
+        "• 总消耗: {total_cost} 钻石\n\n"
+        "✨ 详细结果请查看操作日志"
+    )
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1793,6 +1814,16 @@ class VipPage(QWidget):
         # 启动线程
         self.batch_vip_thread.start()
     
+    def show_info_nonmodal(self, title: str, text: str):
+        """显示非模态信息框，批量流程结束后日志仍可继续刷新"""
+        msg_box = QMessageBox(self)
+        msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.setWindowTitle(title)
+        msg_box.setText(text)
+        msg_box.setWindowModality(Qt.WindowModality.NonModal)
+        msg_box.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        msg_box.show()
+
     def vip_log_message(self, message: str):
         """添加VIP日志消息"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -1928,18 +1959,24 @@ class VipPage(QWidget):
         self.current_voucher_count = 0
         self.cleanup_voucher_thread()
     
+    def cleanup_thread(self, thread_attr: str, worker_attr: str):
+        """安全地停止并释放 thread_attr/worker_attr 指向的工作线程与 worker"""
+        thread = getattr(self, thread_attr, None)
+        if thread is None:
+            return
+        try:
+            if not thread.isFinished():
+                thread.quit()
+                thread.wait()
+        except RuntimeError:
+            pass  # 线程已被删除
+        finally:
+            setattr(self, thread_attr, None)
+            setattr(self, worker_attr, None)
+
     def cleanup_voucher_thread(self):
         """清理礼券查询线程"""
-        if hasattr(self, 'voucher_thread') and self.voucher_thread is not None:
-            try:
-                if not self.voucher_thread.isFinished():
-                    self.voucher_thread.quit()
-                    self.voucher_thread.wait()
-            except RuntimeError:
-                pass
-            finally:
-                self.voucher_thread = None
-                self.voucher_worker = None
+        self.cleanup_thread('voucher_thread', 'voucher_worker')
     
     def on_category_changed(self, category: str):
         """分类筛选变化"""
@@ -2126,29 +2163,11 @@ class VipPage(QWidget):
     
     def cleanup_shop_thread(self):
         """清理单个购买线程"""
-        if hasattr(self, 'shop_thread') and self.shop_thread is not None:
-            try:
-                if not self.shop_thread.isFinished():
-                    self.shop_thread.quit()
-                    self.shop_thread.wait()
-            except RuntimeError:
-                pass
-            finally:
-                self.shop_thread = None
-                self.shop_worker = None
+        self.cleanup_thread('shop_thread', 'shop_worker')
     
     def cleanup_batch_shop_thread(self):
         """清理批量购买线程"""
-        if hasattr(self, 'batch_shop_thread') and self.batch_shop_thread is not None:
-            try:
-                if not self.batch_shop_thread.isFinished():
-                    self.batch_shop_thread.quit()
-                    self.batch_shop_thread.wait()
-            except RuntimeError:
-                pass
-            finally:
-                self.batch_shop_thread = None
-                self.batch_shop_worker = None
+        self.cleanup_thread('batch_shop_thread', 'batch_shop_worker')
     
     def batch_purchase_selected_items(self):
         """批量购买选中的商品"""
@@ -2359,30 +2378,30 @@ class VipPage(QWidget):
             # 记录批量兑换历史
             self.add_cdk_history(cdk_code, True, f"批量兑换: 成功 {success_count}/{total_accounts}")
             
-            # 显示详细结果
+            # 显示详细结果：汇总后一次性写入日志，避免逐条重绘
+            lines = []
             for result_item in results:
                 account = result_item.get("account", {})
                 username = account.get("username", "未知")
                 if result_item.get("success", False):
                     item_message = result_item.get("message", "")
-                    self.vip_log_message(f"  ✅ {username}: {item_message}")
+                    lines.append(f"  ✅ {username}: {item_message}")
                 else:
                     item_message = result_item.get("message", "未知错误")
-                    self.vip_log_message(f"  ❌ {username}: {item_message}")
+                    lines.append(f"  ❌ {username}: {item_message}")
+            if lines:
+                self.vip_log_message("详细结果:\n" + "\n".join(lines))
             
             # 清空输入框
             self.cdk_input.clear()
             
-            # 显示批量结果对话框
-            QMessageBox.information(
-                self, "批量兑换完成",
-                f"🎉 批量CDK兑换完成！\n\n"
-                f"📊 兑换统计:\n"
-                f"• 总账号数: {total_accounts}\n"
-                f"• 成功数量: {success_count}\n"
-                f"• 失败数量: {failure_count}\n"
-                f"• CDK代码: {cdk_code}\n\n"
-                f"✨ 详细结果请查看操作日志"
+            # 显示批量结果对话框（非模态，不阻塞事件循环）
+            self.show_info_nonmodal(
+                "批量兑换完成",
+                self.BATCH_CDK_DONE_TEMPLATE.format(
+                    total=total_accounts, success=success_count,
+                    failure=failure_count, cdk_code=cdk_code
+                )
             )
         else:
             self.vip_log_message(f"❌ 批量CDK兑换失败: {message}")
@@ -2390,11 +2409,7 @@ class VipPage(QWidget):
             self.add_cdk_history(cdk_code, False, f"批量兑换失败: {message}")
         
         # 清理线程
-        if self.batch_cdk_thread:
-            self.batch_cdk_thread.quit()
-            self.batch_cdk_thread.wait()
-            self.batch_cdk_thread = None
-            self.batch_cdk_worker = None
+        self.cleanup_thread('batch_cdk_thread', 'batch_cdk_worker')
     
     @Slot(str)
     def on_batch_cdk_exchange_error(self, error_msg: str):
@@ -2408,11 +2423,7 @@ class VipPage(QWidget):
         self.add_cdk_history(cdk_code, False, f"批量兑换异常: {error_msg}")
         
         # 清理线程
-        if self.batch_cdk_thread:
-            self.batch_cdk_thread.quit()
-            self.batch_cdk_thread.wait()
-            self.batch_cdk_thread = None
-            self.batch_cdk_worker = None
+        self.cleanup_thread('batch_cdk_thread', 'batch_cdk_worker')
     
     @Slot(dict)
     def on_vip_purchase_completed(self, result: Dict[str, Any]):
@@ -2446,16 +2457,7 @@ class VipPage(QWidget):
             )
         
         # 清理线程（安全方式）
-        if hasattr(self, 'vip_thread') and self.vip_thread is not None:
-            try:
-                if not self.vip_thread.isFinished():
-                    self.vip_thread.quit()
-                    self.vip_thread.wait()
-            except RuntimeError:
-                pass  # 线程已被删除
-            finally:
-                self.vip_thread = None
-                self.vip_worker = None
+        self.cleanup_thread('vip_thread', 'vip_worker')
     
     @Slot(str)
     def on_vip_purchase_error(self, error_msg: str):
@@ -2472,16 +2474,7 @@ class VipPage(QWidget):
         )
         
         # 清理线程（安全方式）
-        if hasattr(self, 'vip_thread') and self.vip_thread is not None:
-            try:
-                if not self.vip_thread.isFinished():
-                    self.vip_thread.quit()
-                    self.vip_thread.wait()
-            except RuntimeError:
-                pass  # 线程已被删除
-            finally:
-                self.vip_thread = None
-                self.vip_worker = None
+        self.cleanup_thread('vip_thread', 'vip_worker')
     
     @Slot(dict)
     def on_batch_vip_purchase_completed(self, result: Dict[str, Any]):
@@ -2501,32 +2494,19 @@ class VipPage(QWidget):
             self.vip_log_message(f"✅ 批量VIP购买完成: 成功 {success_count}/{total_accounts} 个账号")
             self.vip_log_message(f"💎 总消耗钻石: {cost_diamonds * success_count}")
             
-            # 显示详细结果
-            QMessageBox.information(
-                self, "批量购买完成",
-                f"🎉 批量VIP购买已完成！\n\n"
-                f"📊 购买统计:\n"
-                f"• 总账号数: {total_accounts}\n"
-                f"• 成功数量: {success_count}\n"
-                f"• 失败数量: {failure_count}\n"
-                f"• 单价: {cost_diamonds} 钻石\n"
-                f"• 总消耗: {cost_diamonds * success_count} 钻石\n\n"
-                f"✨ 详细结果请查看操作日志"
+            # 显示详细结果（非模态，不阻塞事件循环）
+            self.show_info_nonmodal(
+                "批量购买完成",
+                self.BATCH_VIP_DONE_TEMPLATE.format(
+                    total=total_accounts, success=success_count, failure=failure_count,
+                    cost=cost_diamonds, total_cost=cost_diamonds * success_count
+                )
             )
         else:
             self.vip_log_message(f"❌ 批量VIP购买失败: {message}")
         
         # 清理线程（安全方式）
-        if hasattr(self, 'batch_vip_thread') and self.batch_vip_thread is not None:
-            try:
-                if not self.batch_vip_thread.isFinished():
-                    self.batch_vip_thread.quit()
-                    self.batch_vip_thread.wait()
-            except RuntimeError:
-                pass  # 线程已被删除
-            finally:
-                self.batch_vip_thread = None
-                self.batch_vip_worker = None
+        self.cleanup_thread('batch_vip_thread', 'batch_vip_worker')
     
     @Slot(str)
     def on_batch_vip_purchase_error(self, error_msg: str):
@@ -2543,13 +2523,4 @@ class VipPage(QWidget):
         )
         
         # 清理线程（安全方式）
-        if hasattr(self, 'batch_vip_thread') and self.batch_vip_thread is not None:
-            try:
-                if not self.batch_vip_thread.isFinished():
-                    self.batch_vip_thread.quit()
-                    self.batch_vip_thread.wait()
-            except RuntimeError:
-                pass  # 线程已被删除
-            finally:
-                self.batch_vip_thread = None
-                self.batch_vip_worker = None
\ No newline at end of file
+        self.cleanup_thread('batch_vip_thread', 'batch_vip_worker')
@@ -4,11 +4,12 @@
 批量导入 initial_accounts.json 到数据库
 """
 
-import json
 from pathlib import Path
 import typer
 
 from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.json_io import read_json
+from src.delicious_town_bot.utils.lookup import by_username
 
 app = typer.Typer(add_help_option=False)
 
@@ -26,11 +27,12 @@ def main(
     mgr = AccountManager()
     added = updated = 0
 
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = read_json(path)
     if not isinstance(data, list):
         typer.echo("❌ JSON 格式错误，应为列表")
         raise typer.Exit(code=1)
 
+    existing = by_username(mgr)
     for item in data:
         username = item.get("username")
         password = item.get("password")
@@ -41,8 +43,7 @@ def main(
             mgr.add_account(username, password)
             added += 1
         except ValueError:  # 已存在 → 更新密码
-            acc_list = mgr.list_accounts()
-            acc = next((a for a in acc_list if a.username == username), None)
+            acc = existing.get(username)
             if acc:
                 mgr.update_account(acc.id, password=password)
                 updated += 1
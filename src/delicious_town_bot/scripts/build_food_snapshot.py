@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成 assets/foods.pkl 快照，加快 game_data 冷启动加载
+（foods.json 更新后需重新运行）
+"""
+
+import typer
+
+from src.delicious_town_bot.utils.game_data import write_food_snapshot
+
+app = typer.Typer(add_help_option=False)
+
+@app.command()
+def main():
+    path = write_food_snapshot()
+    typer.secho(f"✅ 已生成食材快照：{path}", fg=typer.colors.GREEN)
+
+if __name__ == "__main__":
+    app()
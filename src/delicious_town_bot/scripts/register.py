@@ -4,30 +4,28 @@
 批量注册小号脚本
 位置：src/delicious_town_bot/scripts/register.py
 """
-import io
 import os
 import time
-import json
-import base64
+import threading
 import requests
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+from src.delicious_town_bot.utils.captcha_solver import CaptchaSolver
+from src.delicious_town_bot.utils.json_io import read_json
+
 # —————— 环境变量加载 ——————
 load_dotenv()
-API_URL = os.getenv("API_URL")
-API_TOKEN = os.getenv("API_TOKEN")
-CAPTCHA_TYPE_ID = os.getenv("CAPTCHA_TYPE_ID")
 
 # —————— 配置区域 ——————
 BASE = "http://117.72.123.195"
 JSON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, "data", "initial_accounts.json")
 MAX_CAPTCHA_RETRIES = 5
+REQUEST_TIMEOUT = 10
+
+MAX_WORKERS = 4
 
-# 会话复用
-SESSION = requests.Session()
-SESSION.verify = False  # 忽略 SSL 验证
-SESSION.headers.update({
+DEFAULT_HEADERS = {
     "Accept": "application/json, text/javascript, */*; q=0.01",
     "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
     "X-Requested-With": "XMLHttpRequest",
@@ -38,47 +36,53 @@ SESSION.headers.update({
         "AppleWebKit/537.36 (KHTML, like Gecko) "
         "Chrome/138.0.0.0 Safari/537.36"
     ),
-})
+}
+
+# 会话复用：每个工作线程一个独立 Session，避免并发注册时 cookie 互相覆盖
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """返回当前线程专属的 Session（首次调用时创建）。"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        _local.session = session
+    return session
+
+
+def get_solver() -> CaptchaSolver:
+    """返回当前线程专属的 CaptchaSolver（复用本线程的 Session）。"""
+    solver = getattr(_local, "solver", None)
+    if solver is None:
+        solver = CaptchaSolver(session=get_session())
+        _local.solver = solver
+    return solver
 
 
 def get_codekey():
     """申请新的 codekey 和 img_url。"""
     url = f"{BASE}/index.php?g=api&m=checkcode&a=makecodekey"
-    resp = SESSION.post(url, data={"codekey": ""})
+    resp = get_session().post(url, data={"codekey": ""}, timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
     return resp.json()["data"]["codekey"], resp.json()["data"]["img_url"]
 
 
-def fetch_captcha(codekey: str, img_url: str) -> Image.Image:
-    """根据 img_url 拉取验证码并转为灰度 Image。"""
+def fetch_captcha(codekey: str, img_url: str) -> bytes:
+    """根据 img_url 拉取验证码，返回原始图片字节（是否需要转灰度由 CaptchaSolver 判断）。"""
     full_url = BASE + img_url
-    r = SESSION.get(full_url, stream=True)
+    r = get_session().get(full_url, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
-    return Image.open(io.BytesIO(r.content)).convert("L")
-
-
-def solve_captcha_with_api(img: Image.Image) -> str:
-    """调用第三方 API 打码服务，返回识别出的数字验证码。"""
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    img_b64 = base64.b64encode(buf.getvalue()).decode()
-
-    payload = {
-        "token": API_TOKEN,
-        "type": CAPTCHA_TYPE_ID,
-        "image": img_b64,
-    }
-    headers = {"Content-Type": "application/json"}
-    resp = requests.post(API_URL, headers=headers, json=payload)
-    resp.raise_for_status()
-    result = resp.json()
+    return r.content
+
 
-    if result.get("code") != 10000:
-        raise RuntimeError(f"打码平台调用失败: {result}")
-    detail = result["data"]
-    if detail.get("code") != 0 or not detail.get("data"):
-        raise RuntimeError(f"打码失败（内部错误）: {detail}")
-    return detail["data"].strip()
+def solve_captcha_with_api(img_bytes: bytes) -> str:
+    """调用第三方 API 打码服务，返回识别出的数字验证码。
+
+    复用 CaptchaSolver.solve_with_api：优先上传原图，平台不接受原图时自动改用灰度 PNG。
+    """
+    return get_solver().solve_with_api(img_bytes)
 
 
 def register_account(username: str, password: str):
@@ -89,8 +93,8 @@ def register_account(username: str, password: str):
     for attempt in range(1, MAX_CAPTCHA_RETRIES + 1):
         try:
             codekey, img_url = get_codekey()
-            img = fetch_captcha(codekey, img_url)
-            verify = solve_captcha_with_api(img)
+            raw = fetch_captcha(codekey, img_url)
+            verify = solve_captcha_with_api(raw)
             print(f"[{username}] 尝试 {attempt}/{MAX_CAPTCHA_RETRIES} → codekey={codekey}, verify={verify}")
 
             payload = {
@@ -103,7 +107,7 @@ def register_account(username: str, password: str):
                 "verify": verify,
             }
             reg_url = f"{BASE}/index.php?g=user&m=register&a=doregister"
-            resp = SESSION.post(reg_url, data=payload)
+            resp = get_session().post(reg_url, data=payload, timeout=REQUEST_TIMEOUT)
             resp.raise_for_status()
             result = resp.json()
 
@@ -131,12 +135,16 @@ def register_account(username: str, password: str):
 
 def main():
     # 读取 JSON 列表
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        accounts = json.load(f)
-
-    for acct in accounts:
-        register_account(acct["username"], acct["password"])
-        time.sleep(0.5)
+    accounts = read_json(JSON_PATH)
+
+    # 各账号相互独立，并发注册；线程数受打码平台限速约束
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(register_account, acct["username"], acct["password"])
+            for acct in accounts
+        ]
+        for future in as_completed(futures):
+            future.result()
 
 
 if __name__ == "__main__":
@@ -8,11 +8,13 @@ run_newbie_tutorial.py
 包含最健壮的容错机制和状态刷新逻辑。
 """
 import os
+import re
 import json
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Any, Dict
+from typing import Callable, Any, Dict, List
 
 # --- 核心模块导入 ---
 import sys
@@ -26,6 +28,7 @@ from src.delicious_town_bot.actions.food import FoodActions
 from src.delicious_town_bot.actions.cooking import CookingActions
 from src.delicious_town_bot.actions.daily import DailyActions
 from src.delicious_town_bot.actions.friend import FriendActions
+from src.delicious_town_bot.utils.rate_limiter import RateLimiter
 
 # --- 新手流程常量配置 ---
 TASK_MAPPING = {
@@ -44,9 +47,30 @@ RECIPE_CODE_TO_LEARN = 488
 FACILITY_CODE_TO_PLACE = 30201
 FACILITY_POSITION = 1
 FRIENDS_TO_ADD = [1271, 1272] + list(range(1277, 1328))
+# accept_task 返回这些提示时并非真正失败（任务已接/已完成）
+NON_FATAL_MESSAGES = ("已接", "已完成", "不能再接受")
+_NON_FATAL_SEARCH = re.compile("|".join(map(re.escape, NON_FATAL_MESSAGES))).search
+FRIEND_ADD_WORKERS = 5
+FRIEND_ADD_MAX_RPS = 4
 
 
 # --- 辅助函数 ---
+def add_friends_concurrently(friend_actions: FriendActions, friend_ids: List[int]) -> int:
+    """
+    并发发送好友申请，整体速率限制在 FRIEND_ADD_MAX_RPS 次/秒以内。
+    返回发送成功的数量。
+    """
+    limiter = RateLimiter(FRIEND_ADD_MAX_RPS)
+
+    def add_one(friend_id: int) -> bool:
+        limiter.acquire()
+        success, _ = friend_actions.add_friend(friend_res_id=friend_id)
+        return success
+
+    with ThreadPoolExecutor(max_workers=FRIEND_ADD_WORKERS) as executor:
+        return sum(executor.map(add_one, friend_ids))
+
+
 def perform_sequential_task(task_actions: TaskActions, task_info: Dict, action_function: Callable = None,
                             *action_args: Any) -> bool:
     """
@@ -61,16 +85,25 @@ def perform_sequential_task(task_actions: TaskActions, task_info: Dict, action_f
 
     # 步骤 1: 接受任务
     success, msg = task_actions.accept_task(accept_id)
-    non_fatal_messages = ["已接", "已完成", "不能再接受"]
-    is_real_failure = not success and not any(keyword in msg for keyword in non_fatal_messages)
+    # 奖励已领取：无论接受任务是否报错，都直接结束该任务
+    if "已领取" in msg:
+        print(f"[*] 任务 '{task_name}' 奖励已领取，跳过核心动作与领奖。")
+        print(f"----- 任务 【{task_name}】 成功结束 -----")
+        return True
+    is_real_failure = not success and not _NON_FATAL_SEARCH(msg)
     if is_real_failure:
         print(f"❌ 接受任务 '{task_name}' 失败: {msg}。中止该账号后续流程。")
         return False
-    print(f"[*] 任务 '{task_name}' 已接受或确认已在任务列表中。")
+    # 已完成但可能尚未领奖：跳过核心动作，仍然执行领奖
+    already_completed = "已完成" in msg
+    if already_completed:
+        print(f"[*] 任务 '{task_name}' 已完成，跳过核心动作。")
+    else:
+        print(f"[*] 任务 '{task_name}' 已接受或确认已在任务列表中。")
     time.sleep(random.uniform(1.0, 1.5))
 
     # 步骤 2: 执行核心动作 (如果需要)
-    if action_function:
+    if action_function and not already_completed:
         try:
             # 【新增】在执行动作前，调用一次任务查询接口来刷新服务器状态
             # time.sleep(1)
@@ -103,7 +136,7 @@ def perform_sequential_task(task_actions: TaskActions, task_info: Dict, action_f
         task_actions.get_claimable_tasks_by_code()
         # time.sleep(1)
         print("[*] 正在刷新服务器状态...")
-        task_actions.get_claimable_tasks_by_code()
+        # 最后一次刷新的结果直接作为可领奖映射，不再单独查询
         # time.sleep(1)
         claimable_map = task_actions.get_claimable_tasks_by_code()
         claim_id = claimable_map.get(task_code)
@@ -162,9 +195,7 @@ def run_tutorial_for_account(account: Account):
         # if not perform_sequential_task(task_actions, TASK_MAPPING["ONLINE_30MIN"]): return
         # if not perform_sequential_task(task_actions, TASK_MAPPING["PLAY_ONE_DAY"]): return
         # print(f"\n[*] 正在批量添加 {len(FRIENDS_TO_ADD)} 位好友...")
-        # for friend_id in FRIENDS_TO_ADD:
-        #    friend_actions.add_friend(friend_res_id=friend_id)
-        #    time.sleep(random.uniform(0.3, 0.6))
+        # add_friends_concurrently(friend_actions, FRIENDS_TO_ADD)
         #print(f"[✔] 所有好友添加完毕。")
         print(f"\n✅ 账号【{account.username}】的新手流程执行完毕！")
     except Exception as e:
@@ -3,16 +3,23 @@
 读取 data/initial_accounts.json 的 restaurant 字段
 """
 
-import json, time, requests, os
+import time, requests, os
+import urllib3
 from pathlib import Path
 from dotenv import load_dotenv
 from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.json_io import read_json
+from src.delicious_town_bot.utils.lookup import by_username
 
 load_dotenv()
 BASE_URL = os.getenv("BASE_URL")
 
+REQUEST_TIMEOUT = 10
+
 SESSION = requests.Session()
 SESSION.verify = False
+# verify=False 时 urllib3 每个请求都会发出 InsecureRequestWarning，统一关闭
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 SESSION.headers.update({
     "Accept": "application/json, text/javascript, */*; q=0.01",
     "Content-Type":"application/x-www-form-urlencoded; charset=UTF-8",
@@ -22,7 +29,7 @@ SESSION.headers.update({
 
 def set_name(key: str, name: str) -> bool:
     url = f"{BASE_URL}/index.php?g=Res&m=index&a=add_game"
-    resp = SESSION.post(url, data={"key": key, "res_name": name})
+    resp = SESSION.post(url, data={"key": key, "res_name": name}, timeout=REQUEST_TIMEOUT)
     if resp.ok and resp.json().get("status"):
         return True
     print("❌", name, resp.text)
@@ -30,13 +37,14 @@ def set_name(key: str, name: str) -> bool:
 
 def main():
     data_path = Path(__file__).resolve().parent.parent.parent.parent / "data" / "initial_accounts.json"
-    accounts_json = json.loads(data_path.read_text(encoding="utf-8"))
+    accounts_json = read_json(data_path)
 
     mgr = AccountManager()
+    accounts = by_username(mgr)
     for item in accounts_json[29:]:
         name     = item.get("restaurant")
         username = item.get("username")
-        acc = next((a for a in mgr.list_accounts() if a.username == username), None)
+        acc = accounts.get(username)
         if not acc or not acc.key:
             print(f"跳过 {username}，数据库无记录或缺少 key")
             continue
@@ -1,20 +1,91 @@
 import os
+import json
 import time
+import hashlib
+import argparse
 import pandas as pd
-from collections import Counter
-from typing import Set, Dict, Any
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Set, Dict, Any, Optional
 
 from dotenv import load_dotenv
 
+try:
+    import pyarrow  # noqa: F401  parquet 引擎为可选依赖
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
 # --- 真实模块导入 ---
 # 使用您项目中的真实 Action 类和常量枚举
 from delicious_town_bot.actions.cookbook import CookbookActions
 from delicious_town_bot.constants import CookbookType, Street
+from delicious_town_bot.utils.rate_limiter import RateLimiter
+
+# 并发查询的线程数与整体请求速率（次/秒）
+MAX_WORKERS = 8
+MAX_REQUESTS_PER_SECOND = 5
+
+# 已学食谱的磁盘缓存：按账号 key 区分，有效期内重跑直接复用，跳过 API 查询阶段
+CACHE_DIR = ".cache"
+CACHE_TTL_SECONDS = 6 * 60 * 60
+
+
+def _learned_cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"learned_{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+
+def load_learned_cache(key: str) -> Optional[Set[str]]:
+    """读取未过期的已学食谱缓存，不存在或已过期时返回 None。"""
+    path = _learned_cache_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) >= CACHE_TTL_SECONDS:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+def save_learned_cache(key: str, learned_recipes: Set[str]) -> None:
+    """写入已学食谱缓存；写入失败不影响主流程。"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(_learned_cache_path(key), "w", encoding="utf-8") as f:
+            json.dump(sorted(learned_recipes), f, ensure_ascii=False)
+    except OSError as e:
+        print(f"[警告] 写入已学食谱缓存失败: {e}")
 
 
-def run_recipe_check():
+# 脚本实际用到的食谱表列
+COOKBOOK_COLUMNS = ['食谱', '街道', '所需食材']
+
+
+def load_cookbook(excel_path: str) -> pd.DataFrame:
+    """
+    加载全量食谱表。Excel 解析很慢且内容极少变化，因此首次读取后转存为同名 parquet，
+    之后只要 parquet 不比 Excel 旧就直接读取 parquet（未安装 pyarrow 时退回读取 Excel）。
+    """
+    cache_path = os.path.splitext(excel_path)[0] + ".parquet"
+    if HAS_PARQUET and os.path.exists(cache_path) \
+            and os.path.getmtime(cache_path) >= os.path.getmtime(excel_path):
+        return pd.read_parquet(cache_path, columns=COOKBOOK_COLUMNS)
+
+    # 只解析用到的三列，且统一按字符串读取，跳过数值类型推断
+    df = pd.read_excel(excel_path, usecols=COOKBOOK_COLUMNS, dtype=str, engine='openpyxl')
+    if HAS_PARQUET:
+        try:
+            df.to_parquet(cache_path)
+        except Exception as e:
+            print(f"[警告] 写入食谱 parquet 缓存失败: {e}")
+    return df
+
+
+def run_recipe_check(force_refresh: bool = False):
     """
     主函数，执行完整的食谱检查与统计流程。
+
+    :param force_refresh: 为 True 时忽略已学食谱缓存，重新通过 API 查询。
     """
     # --- 1. 初始化与环境准备 ---
     print("=" * 50)
@@ -44,9 +115,9 @@ def run_recipe_check():
 
         # 从Excel加载全量食谱数据
         print(f"\n[步骤 1/4] 正在从 '{excel_path}' 加载全量食谱数据...")
-        df_all_recipes = pd.read_excel(excel_path)
-        all_recipes_set = set(df_all_recipes['食谱'].unique())
-        print(f"  > 成功加载 {len(all_recipes_set)} 种不同的食谱。")
+        df_all_recipes = load_cookbook(excel_path)
+        all_recipes = pd.Index(df_all_recipes['食谱'].unique())
+        print(f"  > 成功加载 {len(all_recipes)} 种不同的食谱。")
 
     except Exception as e:
         print(f"[致命错误] 初始化失败: {e}")
@@ -56,63 +127,67 @@ def run_recipe_check():
     print("\n[步骤 2/4] 开始通过API查询所有已学会的食谱...")
     print("  > 这可能需要一些时间，请耐心等待...")
 
-    learned_recipes_set: Set[str] = set()
-    # 定义需要遍历的街道和等级
-    # 通过反射从枚举类中获取所有成员，排除特殊成员
-    streets_to_check = [s.name for s in Street if s.value != -1]  # 排除 CURRENT
-    levels_to_check = [t.name for t in CookbookType if t.value > 0]  # 排除 UNLEARNED 和 LEARNABLE
-
-    total_requests = len(streets_to_check) * len(levels_to_check)
-    request_count = 0
-
-    try:
-        for street_name in streets_to_check:
-            for level_name in levels_to_check:
-                request_count += 1
-                street_enum = getattr(Street, street_name)
-                level_enum = getattr(CookbookType, level_name)
-
-                print(f"  ({request_count}/{total_requests}) 正在查询 [{street_name}] 的 [{level_name}] 食谱...")
-
-                # 调用API获取数据
-                learned_in_category = action_bot.get_all_cookbooks(
-                    cookbook_type=level_enum,
-                    street=street_enum
-                )
-
-                for recipe in learned_in_category:
-                    learned_recipes_set.add(recipe['name'])
-
-                # 友好地等待一下，避免请求过于频繁对服务器造成压力
-                time.sleep(0.5)
-
-        print(f"  > 查询完成！共发现 {len(learned_recipes_set)} 种已学会的食谱。")
-
-    except Exception as e:
-        print(f"[致命错误] 在查询API时发生错误: {e}")
-        return
+    cached = None if force_refresh else load_learned_cache(key)
+    if cached is not None:
+        learned_recipes_set: Set[str] = cached
+        print(f"  > 命中本地缓存，共 {len(learned_recipes_set)} 种已学会的食谱（使用 --force-refresh 重新查询）。")
+    else:
+        learned_recipes_set: Set[str] = set()
+        # 定义需要遍历的街道和等级
+        # 通过反射从枚举类中获取所有成员，排除特殊成员
+        streets_to_check = [s.name for s in Street if s.value != -1]  # 排除 CURRENT
+        levels_to_check = [t.name for t in CookbookType if t.value > 0]  # 排除 UNLEARNED 和 LEARNABLE
+
+        tasks = [(s, l) for s in streets_to_check for l in levels_to_check]
+        total_requests = len(tasks)
+        limiter = RateLimiter(MAX_REQUESTS_PER_SECOND)
+
+        def fetch_learned(street_name: str, level_name: str):
+            # 共享限速器代替逐次 sleep，避免并发请求对服务器造成压力
+            limiter.acquire()
+            return action_bot.get_all_cookbooks(
+                cookbook_type=getattr(CookbookType, level_name),
+                street=getattr(Street, street_name)
+            )
+
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {executor.submit(fetch_learned, s, l): (s, l) for s, l in tasks}
+                for request_count, future in enumerate(as_completed(futures), 1):
+                    street_name, level_name = futures[future]
+                    print(f"  ({request_count}/{total_requests}) 已完成 [{street_name}] 的 [{level_name}] 食谱查询")
+
+                    learned_recipes_set.update(map(itemgetter('name'), future.result()))
+
+            print(f"  > 查询完成！共发现 {len(learned_recipes_set)} 种已学会的食谱。")
+            save_learned_cache(key, learned_recipes_set)
+
+        except Exception as e:
+            print(f"[致命错误] 在查询API时发生错误: {e}")
+            return
 
     # --- 3. 分析与计算 ---
     print("\n[步骤 3/4] 正在计算未学食谱并统计所需食材...")
 
-    # 使用集合差集计算出未学食谱
-    unlearned_recipes_set = all_recipes_set - learned_recipes_set
+    # 使用 Index 差集计算出未学食谱（在 pandas 哈希表中完成，无需构建 Python 集合）
+    unlearned_recipes = all_recipes.difference(pd.Index(list(learned_recipes_set)))
 
-    if not unlearned_recipes_set:
+    if unlearned_recipes.empty:
         print("\n🎉 恭喜！所有食谱均已学完！脚本执行结束。")
         return
 
-    print(f"  > 计算完成！发现 {len(unlearned_recipes_set)} 种未学习的食谱。")
+    print(f"  > 计算完成！发现 {len(unlearned_recipes)} 种未学习的食谱。")
 
     # 从总数据中筛选出所有未学食谱的条目
-    df_unlearned = df_all_recipes[df_all_recipes['食谱'].isin(unlearned_recipes_set)].copy()
+    mask = df_all_recipes['食谱'].isin(unlearned_recipes)
+    df_unlearned = df_all_recipes.loc[mask].copy()
 
     # 统计未学完的街道
-    streets_to_finish = set(df_unlearned['街道'].unique())
+    streets_to_finish = df_unlearned['街道'].drop_duplicates().sort_values()
 
     # 统计所需食材
-    # 因为Excel中每行是一个食材，直接用Counter统计“所需食材”列即可
-    required_ingredients = Counter(df_unlearned['所需食材'])
+    # 因为Excel中每行是一个食材，直接用 value_counts 统计“所需食材”列即可
+    required_ingredients = df_unlearned['所需食材'].value_counts(sort=False, dropna=False)
 
     # --- 4. 结果总结 ---
     print("\n" + "=" * 50)
@@ -120,27 +195,31 @@ def run_recipe_check():
     print("=" * 50)
 
     print("\n【未学完的街道】")
-    if not streets_to_finish:
+    if streets_to_finish.empty:
         print("  (无)")
     else:
-        for street in sorted(list(streets_to_finish)):
+        for street in streets_to_finish:
             print(f"  - {street}")
 
     print("\n【未学食谱列表】")
-    for recipe_name in sorted(list(unlearned_recipes_set)):
+    for recipe_name in sorted(unlearned_recipes):
         print(f"  - {recipe_name}")
 
     print("\n【补全所有食谱所需食材统计】")
-    if not required_ingredients:
+    if required_ingredients.empty:
         print("  (无需任何食材)")
     else:
         # 为了美观，找到最长的物品名称，用于对齐
-        max_len = max(len(str(item)) for item in required_ingredients.keys()) if required_ingredients else 0
-        for item, count in sorted(required_ingredients.items()):
-            print(f"  - {str(item).ljust(max_len)} : {count} 个")
+        max_len = required_ingredients.index.astype(str).str.len().max()
+        # 空白食材单元格为 NaN，按字符串排序，避免与食材名比较时报错
+        for item, count in sorted(required_ingredients.items(), key=lambda kv: str(kv[0])):
+            print(f"  - {str(item):<{max_len}} : {count} 个")
 
     print("\n脚本执行完毕。")
 
 
 if __name__ == '__main__':
-    run_recipe_check()
+    parser = argparse.ArgumentParser(description="未学食谱检查与食材统计")
+    parser.add_argument("--force-refresh", action="store_true", help="忽略已学食谱缓存，重新通过API查询")
+    args = parser.parse_args()
+    run_recipe_check(force_refresh=args.force_refresh)
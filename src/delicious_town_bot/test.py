@@ -1,6 +1,7 @@
 # run_cup_game.py
 
 import os
+import re
 import random
 import time
 from collections import Counter
@@ -14,6 +15,13 @@ from delicious_town_bot.actions.lottery import (
     GuessCupResult,
     BusinessLogicError,
 )
+from delicious_town_bot.utils.rate_limiter import RateLimiter
+
+# 猜杯请求统一限速（次/秒），取代每轮之间的固定随机等待
+_BUCKET = RateLimiter(rate=5)
+
+# 奖励行：包含 'x' 且不包含 ':' 的行（过滤掉 "获得食材:"、"恭喜你..." 等非奖励行）
+_REWARD_RE = re.compile(r'^[^\n:]*x[^\n:]*$', re.MULTILINE)
 
 
 def parse_rewards(details_text: str) -> List[str]:
@@ -23,18 +31,8 @@ def parse_rewards(details_text: str) -> List[str]:
     :param details_text: guess_cup 方法返回的详情字符串。
     :return: 一个包含所有奖励物品的列表，例如 ["粉条x1", "米酒x1"]。
     """
-    rewards = []
-    # 按行分割，处理多行奖励
-    lines = details_text.strip().split('\n')
-
-    for line in lines:
-        cleaned_line = line.strip()
-        # 核心筛选逻辑：我们认为包含'x'且不包含':'的非空行就是奖励行
-        # 这可以有效过滤掉 "获得食材:"、"恭喜你..." 等非奖励行
-        if cleaned_line and 'x' in cleaned_line and ':' not in cleaned_line:
-            rewards.append(cleaned_line)
-
-    return rewards
+    # 一次正则扫描完成逐行筛选
+    return [line.strip() for line in _REWARD_RE.findall(details_text)]
 
 
 def run_automated_cup_game():
@@ -90,6 +88,7 @@ def run_automated_cup_game():
                 print(f"  [决策] 随机选择第 {my_choice} 号。")
 
                 # 执行猜测并获取结果
+                _BUCKET.acquire()
                 result, details = action_bot.guess_cup(my_choice)
 
                 # 如果游戏结束，解析并记录奖励
@@ -108,7 +107,6 @@ def run_automated_cup_game():
                     break
                 else:  # GUESSED_CORRECT_CONTINUE
                     print("  [结果] ✅ 猜对了！准备进入下一轮。")
-                    time.sleep(random.uniform(0.1, 0.2))  # 随机等待1.5-3秒，模拟人类操作
 
             # 一场游戏结束后，稍作等待
             print("--- 本场游戏结束，准备开始下一场 ---")
@@ -134,10 +132,10 @@ def run_automated_cup_game():
             # 使用 Counter 来自动统计每种物品的数量
             reward_summary = Counter(total_rewards_list)
             # 为了美观，找到最长的物品名称，用于对齐
-            max_len = max(len(item) for item in reward_summary.keys()) if reward_summary else 0
+            max_len = max(map(len, reward_summary)) if reward_summary else 0
 
             for item, count in sorted(reward_summary.items()):
-                print(f"  - {item.ljust(max_len)} : {count} 个")
+                print(f"  - {item:<{max_len}} : {count} 个")
 
         print("\n脚本执行完毕。")
 
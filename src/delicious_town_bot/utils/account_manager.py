@@ -1,14 +1,24 @@
 """
 账号管理工具
 - list_accounts: 查询所有账号
+- list_accounts_bulk: 单次查询返回账号常用列（AccountSnap 列表，进程内缓存，写账号时失效）
 - add_account: 新增账号
 - delete_account: 删除账号
+- get_account_by_username: 按用户名查询单个账号
 - update_account: 修改密码/启用状态
+- bulk_update_accounts: 按主键批量更新多个账号
 - refresh_key: 用登录工具刷新并保存 key + cookie + last_login
+- transaction: 将多个操作合并为一次提交
 """
+import threading
+import time
 from datetime import datetime
-from sqlalchemy.orm import Session
-from src.delicious_town_bot.db.session import DBSession, init_db
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.delicious_town_bot.db.session import Base, SessionLocal, engine, init_db
 from src.delicious_town_bot.db.models import Account
 from src.delicious_town_bot.utils.auth import do_login
 import json
@@ -16,57 +26,198 @@ import json
 # 确保表已创建
 init_db()
 
+
+class AccountSnap(NamedTuple):
+    """账号常用列的只读快照，批量任务的处理单元（普通元组，与数据库会话无关）"""
+    id: int
+    username: str
+    key: Optional[str]
+    cookie: Optional[str]
+    restaurant: Optional[str]
+
+
+# list_accounts_bulk 结果的缓存有效期（秒）；本进程内的账号写操作会立即使缓存失效，
+# 有效期只用于兜底其他进程（如另开的 CLI）对数据库的修改
+ACCOUNT_LIST_CACHE_TTL_SECONDS = 30
+
+# 进程级账号列表缓存：各管理器各自持有 AccountManager 实例，缓存放在模块级才能共享。
+# 每次写账号都递增代数，缓存项带上写入时的代数，代数不一致即视为过期
+_accounts_generation = 0
+_accounts_cache: Dict[tuple, tuple] = {}
+_accounts_cache_lock = threading.Lock()
+
+
+def _invalidate_accounts_cache():
+    global _accounts_generation
+    with _accounts_cache_lock:
+        _accounts_generation += 1
+        _accounts_cache.clear()
+
+
 class AccountManager:
-    def __init__(self):
-        # 每次操作都从 scoped_session 获取
-        self.db: Session = DBSession()
+    def __init__(self, db_url: Optional[str] = None):
+        """
+        :param db_url: 数据库URL，默认使用全局数据库；传入时（如测试）使用独立引擎并自动建表。
+                       内存库（sqlite:// 或 :memory:）所有会话共用同一连接，数据随实例关闭而消失
+        """
+        # 不再持有长期会话：每个操作单独开启并关闭会话，连接及时归还连接池
+        if db_url is None:
+            self._engine = engine
+            self._session_factory = SessionLocal
+        else:
+            in_memory = db_url == "sqlite://" or ":memory:" in db_url
+            self._engine = create_engine(
+                db_url,
+                connect_args={"check_same_thread": False} if db_url.startswith("sqlite") else {},
+                **({"poolclass": StaticPool} if in_memory else {}),
+            )
+            Base.metadata.create_all(bind=self._engine)
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+        # transaction() 期间本线程复用的会话
+        self._tx = threading.local()
+
+    @contextmanager
+    def get_db_session(self):
+        """
+        获取数据库会话上下文管理器。
+        expire_on_commit=False：会话关闭后返回的 Account 属性仍可直接读取。
+        处于 transaction() 中时直接复用事务会话，由事务结束时统一提交。
+        """
+        active = getattr(self._tx, "session", None)
+        if active is not None:
+            yield active
+            return
+        session = self._session_factory(expire_on_commit=False)
+        try:
+            yield session
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        将多个账号操作合并到一个事务中，结束时只提交一次（异常时整体回滚）。
+        不要在事务中执行网络请求（如 refresh_key），以免长时间占用数据库写锁。
+        """
+        if getattr(self._tx, "session", None) is not None:
+            # 嵌套调用并入外层事务
+            yield
+            return
+        with self.get_db_session() as session:
+            self._tx.session = session
+            try:
+                yield
+            finally:
+                self._tx.session = None
+        # 事务内的写操作在提交前已使缓存失效，提交后再失效一次，丢弃期间其他线程读到的旧数据
+        _invalidate_accounts_cache()
 
     def list_accounts(self):
-        return self.db.query(Account).all()
+        with self.get_db_session() as db:
+            return db.query(Account).all()
+
+    @staticmethod
+    def _accounts_bulk_stmt(only_with_key: bool, limit: Optional[int]):
+        stmt = select(Account.id, Account.username, Account.key, Account.cookie, Account.restaurant).order_by(Account.id)
+        if only_with_key:
+            stmt = stmt.where(Account.key.isnot(None), Account.key != '')
+        if limit:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    def list_accounts_bulk(self, only_with_key: bool = False, limit: Optional[int] = None) -> List[AccountSnap]:
+        """
+        一次查询返回账号的 AccountSnap(id, username, key, cookie, restaurant) 列表，不构造ORM对象。
+        :param only_with_key: 只返回有 key 的账号（在SQL中过滤）
+        :param limit: 最多返回的账号数
+        结果按 (only_with_key, limit) 缓存，账号有任何写操作时失效；使用独立数据库或处于事务中时不缓存
+        """
+        if self._engine is not engine or getattr(self._tx, "session", None) is not None:
+            with self.get_db_session() as db:
+                return [AccountSnap(*row) for row in db.execute(self._accounts_bulk_stmt(only_with_key, limit))]
+
+        cache_key = (only_with_key, limit)
+        with _accounts_cache_lock:
+            generation = _accounts_generation
+            cached = _accounts_cache.get(cache_key)
+        if cached and cached[0] == generation and time.monotonic() - cached[1] < ACCOUNT_LIST_CACHE_TTL_SECONDS:
+            # 返回列表副本，调用方修改列表不影响缓存（AccountSnap 本身不可变）
+            return list(cached[2])
+
+        with self.get_db_session() as db:
+            rows = [AccountSnap(*row) for row in db.execute(self._accounts_bulk_stmt(only_with_key, limit))]
+        with _accounts_cache_lock:
+            # 查询期间若有写操作，代数已变，不写入这份可能过期的结果
+            if generation == _accounts_generation:
+                _accounts_cache[cache_key] = (generation, time.monotonic(), rows)
+        return list(rows)
 
     def add_account(self, username: str, password: str):
-        acc = self.db.query(Account).filter_by(username=username).first()
-        if acc:
-            raise ValueError(f"账号 {username} 已存在")
-        acc = Account(username=username, password=password)
-        self.db.add(acc)
-        self.db.commit()
+        with self.get_db_session() as db:
+            acc = db.query(Account).filter_by(username=username).first()
+            if acc:
+                raise ValueError(f"账号 {username} 已存在")
+            acc = Account(username=username, password=password)
+            db.add(acc)
+            db.flush()
+        _invalidate_accounts_cache()
         return acc
 
     def delete_account(self, account_id: int):
-        acc = self.db.query(Account).get(account_id)
-        if not acc:
-            raise ValueError(f"找不到 id={account_id}")
-        self.db.delete(acc)
-        self.db.commit()
+        with self.get_db_session() as db:
+            acc = db.get(Account, account_id)
+            if not acc:
+                raise ValueError(f"找不到 id={account_id}")
+            db.delete(acc)
+        _invalidate_accounts_cache()
 
     def get_account(self, account_id: int):
         """根据ID获取账号信息"""
-        acc = self.db.query(Account).get(account_id)
-        if not acc:
-            raise ValueError(f"找不到 id={account_id}")
-        return acc
+        with self.get_db_session() as db:
+            acc = db.get(Account, account_id)
+            if not acc:
+                raise ValueError(f"找不到 id={account_id}")
+            return acc
+
+    def get_account_by_username(self, username: str) -> Optional[Account]:
+        """根据用户名获取账号（username 有唯一索引），不存在时返回 None"""
+        with self.get_db_session() as db:
+            return db.query(Account).filter_by(username=username).one_or_none()
 
     def update_account(self, account_id: int, **fields):
-        acc = self.db.query(Account).get(account_id)
-        if not acc:
-            raise ValueError(f"找不到 id={account_id}")
-        for k, v in fields.items():
-            setattr(acc, k, v)
-        self.db.commit()
+        with self.get_db_session() as db:
+            acc = db.get(Account, account_id)
+            if not acc:
+                raise ValueError(f"找不到 id={account_id}")
+            for k, v in fields.items():
+                setattr(acc, k, v)
+        _invalidate_accounts_cache()
         return acc
 
+    def bulk_update_accounts(self, updates: List[Dict[str, Any]]):
+        """
+        按主键批量更新账号字段，单个事务内一次 executemany
+        :param updates: [{"id": 账号ID, 字段名: 新值, ...}, ...]
+        """
+        if not updates:
+            return
+        with self.get_db_session() as db:
+            db.execute(update(Account), updates)
+        _invalidate_accounts_cache()
+
     def refresh_key(self, account_id: int):
-        acc = self.db.query(Account).get(account_id)
-        if not acc:
-            raise ValueError(f"找不到 id={account_id}")
-        # 调用登录工具
+        acc = self.get_account(account_id)
+        # 调用登录工具（网络请求期间不占用数据库会话）
         key = do_login(acc.username, acc.password)
         # 假设 do_login 内部不返回 cookie，这里保持默认 '123'
-        acc.key = key
-        acc.last_login = datetime.now()
-        self.db.commit()
+        self.update_account(account_id, key=key, last_login=datetime.now())
         return key
 
     def close(self):
-        self.db.close()
+        """会话已按操作自动关闭；使用独立数据库时释放其连接池。"""
+        if self._engine is not engine:
+            self._engine.dispose()
@@ -11,9 +11,12 @@ import os
 import time
 import json
 import requests
+import urllib3
 from dotenv import load_dotenv
 
 from src.delicious_town_bot.utils.captcha_solver import CaptchaSolver
+from src.delicious_town_bot.utils.http_pool import SHARED_ADAPTER
+from src.delicious_town_bot.utils.rate_limiter import backoff_delay
 
 # —————— 环境加载 ——————
 load_dotenv()
@@ -22,16 +25,28 @@ BASE_URL = os.getenv("BASE_URL")
 LOGIN_PATH = os.getenv("LOGIN_PATH", "/index.php?g=User&m=login&a=dologin")
 MAX_LOGIN_RETRIES = int(os.getenv("LOGIN_MAX_RETRIES", "5"))
 
-# 会话复用
-SESSION = requests.Session()
-SESSION.verify = False
-SESSION.headers.update({
-    "Accept": "application/json, text/javascript, */*; q=0.01",
-    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-    "X-Requested-With": "XMLHttpRequest",
-    "Origin": BASE_URL,
-    "Referer": f"{BASE_URL}/wap/login.html",
-})
+
+# verify=False 会让 urllib3 在每个请求上发出 InsecureRequestWarning，在此统一关闭一次
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+def make_session() -> requests.Session:
+    """创建带通用请求头和连接池的游戏服务器会话（验证码拉取与登录共用）。"""
+    session = requests.Session()
+    session.verify = False
+    session.headers.update({
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "X-Requested-With": "XMLHttpRequest",
+        "Origin": BASE_URL,
+        "Referer": f"{BASE_URL}/wap/login.html",
+    })
+    session.mount("http://", SHARED_ADAPTER)
+    session.mount("https://", SHARED_ADAPTER)
+    return session
+
+
+# 会话复用：验证码与登录请求共享同一个 keep-alive 连接
+SESSION = make_session()
 
 
 def do_login(username: str, password: str, max_retries: int = None) -> str:
@@ -43,7 +58,7 @@ def do_login(username: str, password: str, max_retries: int = None) -> str:
     返回：登录成功后的 key 字符串
     抛出：RuntimeError 登录失败或重试耗尽
     """
-    solver = CaptchaSolver()
+    solver = CaptchaSolver(session=SESSION)
     retries = max_retries or MAX_LOGIN_RETRIES
 
     for i in range(1, retries + 1):
@@ -71,9 +86,12 @@ def do_login(username: str, password: str, max_retries: int = None) -> str:
         else:
             msg = result.get("msg", "未知错误")
             print(f"登录失败：{msg}")
-            if "验证码错误" in msg and i < retries:
-                time.sleep(1)
-                continue
+            if "验证码错误" in msg:
+                # 丢弃该图片的缓存识别结果，避免重试时再次使用错误答案
+                solver.report_wrong()
+                if i < retries:
+                    time.sleep(backoff_delay(i))
+                    continue
             raise RuntimeError(f"登录失败：{msg}")
 
     raise RuntimeError(f"登录失败，已尝试 {retries} 次验证码重试")
@@ -9,17 +9,53 @@ import io
 import os
 import time
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
 import requests
 from dotenv import load_dotenv
 from PIL import Image
 
+from src.delicious_town_bot.utils.rate_limiter import backoff_delay
+from src.delicious_town_bot.utils.http_pool import SHARED_ADAPTER
+
 # 加载根目录 .env
 load_dotenv()
 
+# 验证码识别结果缓存的最大条目数
+CAPTCHA_CACHE_SIZE = 256
+# 打码平台因图片格式拒绝原图时，返回信息中包含的关键字
+FORMAT_REJECTION_MARKS = ("格式", "format")
+
+# 打码平台是否只接受灰度 PNG（进程内共享，各 CaptchaSolver 实例共用）：None 表示尚未确定。
+# 原图首次识别失败时用灰度图试探一次并记录结果，之后普通的识别失败不再重复付费调用
+_needs_grayscale: Optional[bool] = None
+_grayscale_lock = threading.Lock()
+
+# 图片内容哈希 -> 识别结果 的 LRU 缓存（进程内共享）：登录、购买等调用方每次都新建 CaptchaSolver，
+# 缓存放在模块级才能跨调用复用，重复出现的验证码无需再次调用付费打码接口
+_captcha_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_captcha_cache_lock = threading.Lock()
+
+
+def _api_succeeded(detail: dict) -> bool:
+    return detail.get("code") == 0 and bool(detail.get("data"))
+
+
+def _is_format_rejection(detail: dict) -> bool:
+    message = str(detail.get("msg") or detail.get("message") or "")
+    return any(mark in message.lower() for mark in FORMAT_REJECTION_MARKS)
+
+
 class CaptchaSolver:
     """封装验证码识别流程，支持从 .env 读取配置和自定义重试次数。"""
 
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None):
+        """
+        :param session: 访问游戏服务器的会话；传入登录所用会话时，
+                        拉取验证码与提交登录可复用同一连接。默认新建。
+        """
         # 从环境变量读取配置
         self.base_url = os.getenv("BASE_URL")
         self.api_url = os.getenv("API_URL")
@@ -27,17 +63,20 @@ class CaptchaSolver:
         self.captcha_type = os.getenv("CAPTCHA_TYPE_ID")
         # 默认重试次数为 10
         self.max_retries = int(os.getenv("CAPTCHA_MAX_RETRIES", "10"))
+        # 上一次识别的图片哈希，识别结果被服务器判错时据此从共享缓存中移除
+        self._last_digest: Optional[bytes] = None
+
+        # HTTP 会话（延迟导入 auth，避免与 auth 模块循环导入）
+        from src.delicious_town_bot.utils.auth import make_session
+        if session is None:
+            session = make_session()
+        self.session = session
 
-        # HTTP 会话
-        self.session = requests.Session()
-        self.session.verify = False
-        self.session.headers.update({
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "X-Requested-With": "XMLHttpRequest",
-            "Origin": self.base_url,
-            "Referer": f"{self.base_url}/wap/login.html",
-        })
+        # 打码平台专用会话：复用 keep-alive 连接，避免每次识别都重新握手
+        self.api_session = requests.Session()
+        self.api_session.headers.update({"Content-Type": "application/json"})
+        self.api_session.mount("http://", SHARED_ADAPTER)
+        self.api_session.mount("https://", SHARED_ADAPTER)
 
     def get_codekey(self) -> (str, str):
         """申请新的 codekey 与对应的 img_url。"""
@@ -47,44 +86,93 @@ class CaptchaSolver:
         data = resp.json().get("data", {})
         return data.get("codekey"), data.get("img_url")
 
-    def fetch_captcha(self, codekey: str, img_url: str) -> Image.Image:
-        """拉取验证码图片并转为灰度。"""
+    def fetch_captcha(self, codekey: str, img_url: str) -> bytes:
+        """拉取验证码图片，返回服务器给出的原始字节。"""
         full = self.base_url + img_url
-        r = self.session.get(full, stream=True)
+        r = self.session.get(full)
         r.raise_for_status()
-        return Image.open(io.BytesIO(r.content)).convert("L")
+        return r.content
 
-    def solve_with_api(self, img: Image.Image) -> str:
-        """调用第三方打码平台获取验证码文本。"""
+    @staticmethod
+    def to_grayscale_png(raw: bytes) -> bytes:
+        """将原始图片转为灰度 PNG，仅在打码平台不接受原图时使用。"""
+        img = Image.open(io.BytesIO(raw))
+        # JPEG 可让 libjpeg 直接解码为灰度，省去完整的 RGB 解码与颜色转换；其他格式无影响
+        img.draft("L", img.size)
         buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        img_b64 = base64.b64encode(buf.getvalue()).decode()
+        # 验证码很小，低压缩等级即可，避免 zlib 在最高压缩上耗费 CPU
+        img.convert("L").save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
+
+    def _call_api(self, img_bytes: bytes) -> dict:
+        """上传图片字节到打码平台，返回内层结果 detail。"""
         payload = {
             "token": self.api_token,
             "type": self.captcha_type,
-            "image": img_b64,
+            "image": base64.b64encode(img_bytes).decode(),
         }
-        headers = {"Content-Type": "application/json"}
-        resp = requests.post(self.api_url, json=payload, headers=headers)
+        resp = self.api_session.post(self.api_url, json=payload)
         resp.raise_for_status()
         result = resp.json()
         if result.get("code") != 10000:
             raise RuntimeError(f"打码平台调用失败: {result}")
-        detail = result.get("data", {})
-        if detail.get("code") != 0 or not detail.get("data"):
+        return result.get("data", {})
+
+    def solve_with_api(self, raw: bytes) -> str:
+        """
+        调用第三方打码平台获取验证码文本。
+        直接上传原始图片字节，省去 PIL 解码 + PNG 重编码。
+        只有平台明确因格式拒绝原图，或尚未确定平台是否接受原图（只试探一次）时，才改用灰度 PNG 重试；
+        灰度图识别成功后，之后的调用都直接上传灰度图。
+        """
+        global _needs_grayscale
+        use_grayscale = _needs_grayscale is True
+        detail = self._call_api(self.to_grayscale_png(raw) if use_grayscale else raw)
+        if not _api_succeeded(detail) and not use_grayscale:
+            with _grayscale_lock:
+                should_probe = _needs_grayscale is None or _is_format_rejection(detail)
+            if should_probe:
+                detail = self._call_api(self.to_grayscale_png(raw))
+                with _grayscale_lock:
+                    if _api_succeeded(detail):
+                        _needs_grayscale = True
+                    elif _needs_grayscale is None:
+                        # 灰度图同样失败：视为普通识别失败，平台接受原图
+                        _needs_grayscale = False
+        if not _api_succeeded(detail):
             raise RuntimeError(f"打码失败: {detail}")
         return detail.get("data").strip()
 
+    def report_wrong(self):
+        """服务器提示验证码错误时调用：从缓存中移除上一次的识别结果，避免重复使用错误答案。"""
+        if self._last_digest is not None:
+            with _captcha_cache_lock:
+                _captcha_cache.pop(self._last_digest, None)
+            self._last_digest = None
+
     def solve(self) -> (str, str):
         """完整流程：多次重试获取正确验证码文本与 codekey。"""
         for attempt in range(1, self.max_retries + 1):
             try:
                 codekey, img_url = self.get_codekey()
-                img = self.fetch_captcha(codekey, img_url)
-                text = self.solve_with_api(img)
+                raw = self.fetch_captcha(codekey, img_url)
+                digest = hashlib.blake2b(raw, digest_size=16).digest()
+                self._last_digest = digest
+                with _captcha_cache_lock:
+                    text = _captcha_cache.get(digest)
+                    if text is not None:
+                        _captcha_cache.move_to_end(digest)
+                if text is not None:
+                    # 同一张图片已识别过，直接复用，不再调用付费打码接口
+                    return text, codekey
+                text = self.solve_with_api(raw)
+                with _captcha_cache_lock:
+                    _captcha_cache[digest] = text
+                    if len(_captcha_cache) > CAPTCHA_CACHE_SIZE:
+                        _captcha_cache.popitem(last=False)
                 return text, codekey
             except Exception as e:
                 if attempt < self.max_retries:
-                    time.sleep(1)
+                    time.sleep(backoff_delay(attempt))
                     continue
                 raise
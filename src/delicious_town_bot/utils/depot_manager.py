@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any, Optional
 
 from src.delicious_town_bot.utils.account_manager import AccountManager
@@ -8,10 +9,14 @@ from src.delicious_town_bot.constants import ItemType
 class DepotManager:
     def __init__(self):
         self.account_mgr = AccountManager()
+        # account_id -> DepotAction，每个账号只保留一个实例；key/cookie 变化时切换凭据，不新建实例
+        self._action_cache: Dict[int, DepotAction] = {}
 
     def _get_action_for_account(self, account_id: int) -> Optional[DepotAction]:
-        all_accounts = self.account_mgr.list_accounts()
-        account = next((acc for acc in all_accounts if acc.id == account_id), None)
+        try:
+            account = self.account_mgr.get_account(account_id)
+        except ValueError:
+            account = None
 
         if not account:
             print(f"DepotManager Error: 无法找到 ID={account_id} 的账号。")
@@ -21,12 +26,21 @@ class DepotManager:
             print(f"DepotManager Error: 账号 ID={account_id} 缺少 key 或 cookie。")
             return None
 
+        cookie_dict = {"PHPSESSID": str(account.cookie)}
+        action = self._action_cache.get(account_id)
+        if action is not None:
+            if action.key != account.key or action.cookie != cookie_dict:
+                # key 刷新后复用原实例的 Session，只更新凭据
+                action.set_credentials(account.key, cookie_dict)
+            return action
+
         try:
-            cookie_dict = {"PHPSESSID": str(account.cookie)}
-            return DepotAction(key=account.key, cookie=cookie_dict)
+            action = DepotAction(key=account.key, cookie=cookie_dict)
         except Exception as e:
             print(f"DepotManager Error: 实例化 DepotAction 失败 for account ID={account_id}. Error: {e}")
             return None
+        self._action_cache[account_id] = action
+        return action
 
     def get_items_for_account(self, account_id: int, item_type: ItemType) -> List[Dict[str, Any]]:
         action = self._get_action_for_account(account_id)
@@ -37,6 +51,23 @@ class DepotManager:
             print(f"获取物品时出错 (account_id={account_id}, item_type={item_type.name}): {e}")
             return []
 
+    def get_all_items_bulk(self, account_id: int, item_types: List[ItemType]) -> Dict[ItemType, List[Dict[str, Any]]]:
+        """一次性获取同一账号多个分类的物品：复用同一个 DepotAction，各分类并发请求。"""
+        results: Dict[ItemType, List[Dict[str, Any]]] = {t: [] for t in item_types}
+        action = self._get_action_for_account(account_id)
+        if not action or not item_types:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(8, len(item_types))) as executor:
+            futures = {executor.submit(action.get_all_items, t): t for t in item_types}
+            for future in as_completed(futures):
+                item_type = futures[future]
+                try:
+                    results[item_type] = future.result()
+                except Exception as e:
+                    print(f"获取物品时出错 (account_id={account_id}, item_type={item_type.name}): {e}")
+        return results
+
     # [核心修改] 增加 step_2_data 参数
     def use_item_for_account(self, account_id: int, item_code: str, step_2_data: Optional[Any] = None) -> bool:
         """为指定账号使用一个物品，支持额外数据。"""
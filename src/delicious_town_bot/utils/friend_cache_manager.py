@@ -1,20 +1,136 @@
+import csv
+import io
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from contextlib import contextmanager
-from src.delicious_town_bot.db.session import DBSession
+from sqlalchemy import select, text
+from src.delicious_town_bot.db.session import DBSession, upsert_insert
 from src.delicious_town_bot.db.models import FriendCache, Account
+from src.delicious_town_bot.actions.base_action import NETWORK_FAILURE_MARK
 from src.delicious_town_bot.actions.friend import FriendActions
+from src.delicious_town_bot.utils.account_manager import AccountSnap
+from src.delicious_town_bot.utils.http_pool import SHARED_ADAPTER
+from src.delicious_town_bot.utils.rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# 获取好友用户卡片时的并发线程数与每秒最大请求数
+CARD_FETCH_WORKERS = 8
+CARD_FETCH_MAX_RPS = 10
+# 刷新所有账号好友缓存时同时处理的账号数
+ACCOUNT_REFRESH_WORKERS = 6
+# 批量写入好友缓存时每条语句的行数（同时避免超出 SQLite 单条语句的参数上限）
+FRIEND_CACHE_WRITE_BATCH = 500
+# 进程内好友缓存有效期（秒），数据变更时会主动失效
+MEM_CACHE_TTL_SECONDS = 60
+
+# 读取缓存时只取这几列（顺序对应 id/name/level/avatar）
+FRIEND_COLUMNS = (FriendCache.friend_id, FriendCache.friend_name, FriendCache.friend_level, FriendCache.friend_avatar)
+
+# 批量写入好友缓存的列
+FRIEND_CACHE_WRITE_COLUMNS = ('account_id', 'friend_id', 'friend_name', 'friend_level', 'friend_avatar', 'last_updated')
+
+
+def _as_int(value: Any) -> Any:
+    """与数据库 Integer 列读回的类型保持一致；无法转换时原样返回"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _upsert_statement(dialect_insert, rows: List[Dict[str, Any]]):
+    """构造按 (account_id, friend_id) 冲突时更新的多行 INSERT 语句"""
+    stmt = dialect_insert(FriendCache).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=['account_id', 'friend_id'],
+        set_={
+            'friend_name': stmt.excluded.friend_name,
+            'friend_level': stmt.excluded.friend_level,
+            'friend_avatar': stmt.excluded.friend_avatar,
+            'last_updated': stmt.excluded.last_updated,
+        }
+    )
+
+
+def _copy_friend_cache_pg(session, rows: List[Dict[str, Any]]) -> None:
+    """PostgreSQL + psycopg2：COPY 到临时表，再一条 INSERT ... SELECT ... ON CONFLICT 合并到正式表"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[col] for col in FRIEND_CACHE_WRITE_COLUMNS])
+    buf.seek(0)
+
+    cols = ', '.join(FRIEND_CACHE_WRITE_COLUMNS)
+    session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS friend_cache_stage ("
+        "account_id integer, friend_id integer, friend_name varchar(64), "
+        "friend_level integer, friend_avatar varchar(128), last_updated timestamp"
+        ") ON COMMIT DELETE ROWS"
+    ))
+    session.execute(text("TRUNCATE friend_cache_stage"))
+    raw_conn = session.connection().connection
+    with raw_conn.cursor() as cur:
+        cur.copy_expert(f"COPY friend_cache_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+    session.execute(text(
+        f"INSERT INTO friend_cache ({cols}) SELECT {cols} FROM friend_cache_stage "
+        "ON CONFLICT (account_id, friend_id) DO UPDATE SET "
+        "friend_name = EXCLUDED.friend_name, friend_level = EXCLUDED.friend_level, "
+        "friend_avatar = EXCLUDED.friend_avatar, last_updated = EXCLUDED.last_updated"
+    ))
+
+
+def _bulk_write_friend_cache(session, rows: List[Dict[str, Any]]) -> None:
+    """
+    按 (account_id, friend_id) 批量写入好友缓存：已存在则更新，不存在则插入。
+    - PostgreSQL(psycopg2)：COPY 临时表后合并
+    - SQLite / 其他驱动的 PostgreSQL：每 FRIEND_CACHE_WRITE_BATCH 行一条多行 VALUES 的 UPSERT
+    - 不支持 UPSERT 的数据库：先删后插
+    """
+    if not rows:
+        return
+
+    dialect = session.get_bind().dialect
+    if dialect.name == 'postgresql' and dialect.driver == 'psycopg2':
+        _copy_friend_cache_pg(session, rows)
+        return
+
+    dialect_insert = upsert_insert(session)
+    if dialect_insert is None:
+        session.query(FriendCache).filter(
+            FriendCache.account_id.in_({row['account_id'] for row in rows})
+        ).delete(synchronize_session=False)
+        session.bulk_insert_mappings(FriendCache, rows)
+        return
+
+    for start in range(0, len(rows), FRIEND_CACHE_WRITE_BATCH):
+        session.execute(_upsert_statement(dialect_insert, rows[start:start + FRIEND_CACHE_WRITE_BATCH]))
 
 
 class FriendCacheManager:
     """好友缓存管理器，用于缓存和管理好友数据"""
 
     def __init__(self):
-        pass
+        # 进程内短期缓存：{(账号ID, max_age_hours): (写入时间, 好友元组)}，避免短时间内重复查库。
+        # 缓存内的数据不直接交给调用方，每次返回副本，调用方修改返回值不会污染缓存
+        self._mem_cache: Dict[Tuple[int, int], Tuple[float, Tuple[Dict[str, Any], ...]]] = {}
+        self._mem_lock = threading.Lock()
+        # 每次失效都递增；查询前后代数不一致说明期间有写入，查到的结果不再放入缓存
+        self._mem_generation = 0
+        # 用户卡片缓存：{用户ID: 卡片信息}，同一用户常出现在多个账号的好友列表中，只请求一次
+        self._card_cache: Dict[str, Dict[str, Any]] = {}
+        self._card_lock = threading.Lock()
+        # 所有账号共用一个限速器：并发刷新多个账号时，对游戏服务器的总请求速率仍不超过 CARD_FETCH_MAX_RPS
+        self._card_limiter = AdaptiveRateLimiter(rate=CARD_FETCH_MAX_RPS)
 
     @contextmanager
     def get_db_session(self):
-        """获取数据库会话上下文管理器"""
+        """获取数据库会话上下文管理器（当前线程的 scoped_session，连接取自连接池）"""
         session = DBSession()
         try:
             yield session
@@ -23,7 +139,15 @@ class FriendCacheManager:
             session.rollback()
             raise e
         finally:
-            session.close()
+            # 关闭会话并从线程注册表移除，连接归还连接池，线程池中的工作线程不会残留会话
+            DBSession.remove()
+
+    def _invalidate_mem_cache(self, account_id: int):
+        """清除某账号在进程内缓存中的所有条目（各 max_age_hours）"""
+        with self._mem_lock:
+            self._mem_generation += 1
+            for cache_key in [k for k in self._mem_cache if k[0] == account_id]:
+                del self._mem_cache[cache_key]
 
     def get_cached_friends(self, account_id: int, max_age_hours: int = 24) -> Optional[List[Dict[str, Any]]]:
         """
@@ -32,127 +156,171 @@ class FriendCacheManager:
         :param max_age_hours: 缓存最大有效时间（小时）
         :return: 好友列表或None
         """
+        cache_key = (account_id, max_age_hours)
+        with self._mem_lock:
+            entry = self._mem_cache.get(cache_key)
+            generation = self._mem_generation
+        if entry and time.monotonic() - entry[0] < MEM_CACHE_TTL_SECONDS:
+            return [dict(friend) for friend in entry[1]]
+
         with self.get_db_session() as session:
             cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
             
-            # 查询缓存的好友数据
-            cached_friends = session.query(FriendCache).filter(
+            # 只查询需要的列，直接得到元组行，不构造ORM对象
+            stmt = select(*FRIEND_COLUMNS).where(
                 FriendCache.account_id == account_id,
                 FriendCache.last_updated >= cutoff_time
-            ).all()
+            )
+            rows = session.execute(stmt).all()
             
-            if not cached_friends:
+            if not rows:
                 return None
             
             # 转换为标准格式
-            friends_list = []
-            for friend in cached_friends:
-                friends_list.append({
-                    'id': friend.friend_id,
-                    'name': friend.friend_name,
-                    'level': friend.friend_level,
-                    'avatar': friend.friend_avatar
-                })
+            friends_list = [
+                {'id': friend_id, 'name': name, 'level': level, 'avatar': avatar}
+                for friend_id, name, level, avatar in rows
+            ]
             
+            with self._mem_lock:
+                if generation == self._mem_generation:
+                    self._mem_cache[cache_key] = (time.monotonic(), tuple(dict(friend) for friend in friends_list))
             print(f"[Cache] 从缓存获取到 {len(friends_list)} 个好友 (账号ID: {account_id})")
             return friends_list
 
-    def update_friends_cache(self, account_id: int, friends_data: List[Dict[str, Any]], key: str, cookie: Optional[Dict[str, str]] = None) -> bool:
+    def get_cached_friends_bulk(self, account_ids: List[int], max_age_hours: int = 24) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        一次查询批量获取多个账号的缓存好友列表（单条 WHERE account_id IN (...)，避免逐账号查询）
+        :param account_ids: 账号ID列表
+        :param max_age_hours: 缓存最大有效时间（小时）
+        :return: {账号ID: 好友列表}，没有有效缓存的账号不会出现在结果中
+        """
+        if not account_ids:
+            return {}
+
+        with self.get_db_session() as session:
+            cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
+
+            stmt = select(FriendCache.account_id, *FRIEND_COLUMNS).where(
+                FriendCache.account_id.in_(account_ids),
+                FriendCache.last_updated >= cutoff_time
+            )
+
+            grouped = defaultdict(list)
+            for acc_id, friend_id, name, level, avatar in session.execute(stmt):
+                grouped[acc_id].append({'id': friend_id, 'name': name, 'level': level, 'avatar': avatar})
+
+            print(f"[Cache] 批量查询 {len(account_ids)} 个账号，其中 {len(grouped)} 个有有效缓存")
+            return dict(grouped)
+
+    def update_friends_cache(self, account_id: int, friends_data: List[Dict[str, Any]], key: str,
+                             cookie: Optional[Dict[str, str]] = None) -> Optional[List[Dict[str, Any]]]:
         """
         更新好友缓存，通过用户卡片API获取每个好友的真正餐厅ID
         :param account_id: 账号ID
         :param friends_data: 好友数据列表（包含用户ID）
         :param key: 当前账号的key，用于调用用户卡片API
         :param cookie: 当前账号的cookie
-        :return: 是否成功
+        :return: 写入缓存的好友列表（与 get_cached_friends 格式相同），失败返回None
         """
+        # 数据即将变更，先使进程内缓存失效
+        self._invalidate_mem_cache(account_id)
+
+        # 通过用户卡片API获取每个好友的餐厅ID（网络等待为主，线程池并发请求）
+        from src.delicious_town_bot.actions.user_card import UserCardAction
+        # 所有账号、所有工作线程共用同一个长连接池，避免每个账号各自重新建立TCP连接
+        user_card_action = UserCardAction(key=key, cookie=cookie, adapter=SHARED_ADAPTER)
+        limiter = self._card_limiter
+
+        def _fetch_card(friend: Dict[str, Any]):
+            user_id = str(friend.get('id'))
+            with self._card_lock:
+                cached = self._card_cache.get(user_id)
+            if cached is not None:
+                return friend, cached
+
+            limiter.acquire()
+            try:
+                card_info = user_card_action.get_user_card(user_id)
+            except Exception as e:
+                limiter.penalize()
+                return friend, e
+            # 网络层失败（限流/5xx 重试耗尽）时降速，成功时逐步恢复；业务失败不影响速率
+            if card_info.get('success'):
+                limiter.reward()
+                with self._card_lock:
+                    self._card_cache[user_id] = card_info
+            elif NETWORK_FAILURE_MARK in card_info.get('message', ''):
+                limiter.penalize()
+            return friend, card_info
+
+        total = len(friends_data)
+        print(f"[Cache] 开始获取 {total} 个好友的真正餐厅ID...")
+        with ThreadPoolExecutor(max_workers=CARD_FETCH_WORKERS) as executor:
+            results = list(executor.map(_fetch_card, friends_data))
+
         try:
+            now = datetime.now()
+            cache_rows = []
+            successful_count = 0
+
+            for i, (friend, card_info) in enumerate(results):
+                user_id = friend.get('id')  # 这是用户ID，不是餐厅ID
+                friend_name = friend.get('name', '未知好友')
+                # 默认保存基础信息，使用用户ID作为fallback
+                friend_id, name = user_id, friend_name
+
+                if isinstance(card_info, Exception):
+                    logger.error("[%d/%d] 处理好友 %s 时发生异常: %s", i + 1, total, friend_name, card_info)
+                elif card_info.get('success'):
+                    restaurant_info = card_info['restaurant_info']
+                    friend_id = restaurant_info.get('id')  # 真正的餐厅ID
+                    name = restaurant_info.get('name', friend_name)  # 使用餐厅名称
+                    successful_count += 1
+
+                    logger.info("[%d/%d] %s (用户ID:%s) -> 餐厅ID:%s, 餐厅名:%s",
+                                i + 1, total, friend_name, user_id, friend_id, name)
+                else:
+                    logger.warning("[%d/%d] 获取 %s 的餐厅ID失败: %s",
+                                   i + 1, total, friend_name, card_info.get('message', '未知错误'))
+
+                cache_rows.append({
+                    'account_id': account_id,
+                    'friend_id': _as_int(friend_id),
+                    'friend_name': name,
+                    'friend_level': friend.get('level'),
+                    'friend_avatar': friend.get('avatar'),
+                    'last_updated': now
+                })
+
+            # (account_id, friend_id) 唯一，同一餐厅ID只保留最后一条
+            cache_rows = list({row['friend_id']: row for row in cache_rows}.values())
+
+            # 所有请求完成后一次性写库：UPSERT 新数据 + 删除已不在好友列表中的旧记录，同一事务内
             with self.get_db_session() as session:
-                # 删除旧缓存
+                _bulk_write_friend_cache(session, cache_rows)
                 session.query(FriendCache).filter(
-                    FriendCache.account_id == account_id
-                ).delete()
-                
-                # 通过用户卡片API获取每个好友的餐厅ID
-                from src.delicious_town_bot.actions.user_card import UserCardAction
-                user_card_action = UserCardAction(key=key, cookie=cookie)
-                
-                now = datetime.now()
-                cached_friends = []
-                successful_count = 0
-                
-                print(f"[Cache] 开始获取 {len(friends_data)} 个好友的真正餐厅ID...")
-                
-                for i, friend in enumerate(friends_data):
-                    user_id = friend.get('id')  # 这是用户ID，不是餐厅ID
-                    friend_name = friend.get('name', '未知好友')
-                    
-                    try:
-                        # 通过用户卡片API获取真正的餐厅ID
-                        card_info = user_card_action.get_user_card(str(user_id))
-                        
-                        if card_info.get('success'):
-                            restaurant_info = card_info['restaurant_info']
-                            restaurant_id = restaurant_info.get('id')  # 真正的餐厅ID
-                            restaurant_name = restaurant_info.get('name', friend_name)
-                            
-                            cache_entry = FriendCache(
-                                account_id=account_id,
-                                friend_id=restaurant_id,  # 存储真正的餐厅ID
-                                friend_name=restaurant_name,  # 使用餐厅名称
-                                friend_level=friend.get('level'),
-                                friend_avatar=friend.get('avatar'),
-                                last_updated=now
-                            )
-                            cached_friends.append(cache_entry)
-                            session.add(cache_entry)
-                            successful_count += 1
-                            
-                            # 显示详细进度（每10个或重要节点）
-                            if (i + 1) % 10 == 0 or (i + 1) == len(friends_data) or (i + 1) <= 5:
-                                print(f"[Cache] [{i + 1}/{len(friends_data)}] {friend_name} (用户ID:{user_id}) -> 餐厅ID:{restaurant_id}, 餐厅名:{restaurant_name}")
-                        else:
-                            print(f"[Warning] [{i + 1}/{len(friends_data)}] 获取 {friend_name} 的餐厅ID失败: {card_info.get('message', '未知错误')}")
-                            
-                            # 即使失败也保存基础信息，使用用户ID作为fallback
-                            cache_entry = FriendCache(
-                                account_id=account_id,
-                                friend_id=user_id,  # fallback到用户ID
-                                friend_name=friend_name,
-                                friend_level=friend.get('level'),
-                                friend_avatar=friend.get('avatar'),
-                                last_updated=now
-                            )
-                            cached_friends.append(cache_entry)
-                            session.add(cache_entry)
-                            
-                    except Exception as e:
-                        print(f"[Error] [{i + 1}/{len(friends_data)}] 处理好友 {friend_name} 时发生异常: {e}")
-                        
-                        # 异常时也保存基础信息
-                        cache_entry = FriendCache(
-                            account_id=account_id,
-                            friend_id=user_id,  # fallback到用户ID
-                            friend_name=friend_name,
-                            friend_level=friend.get('level'),
-                            friend_avatar=friend.get('avatar'),
-                            last_updated=now
-                        )
-                        cached_friends.append(cache_entry)
-                        session.add(cache_entry)
-                    
-                    # 避免API调用过快，每5个请求暂停一下
-                    if (i + 1) % 5 == 0:
-                        import time
-                        time.sleep(0.5)
-                
-                session.commit()
-                print(f"[Cache] 缓存更新完成: 总计 {len(cached_friends)} 个好友, 成功获取餐厅ID: {successful_count} 个 (账号ID: {account_id})")
-                return True
-                
+                    FriendCache.account_id == account_id,
+                    FriendCache.last_updated < now
+                ).delete(synchronize_session=False)
+            # 提交后再失效一次：丢弃写入期间其他线程从数据库读到并缓存的旧数据
+            self._invalidate_mem_cache(account_id)
+
+            print(f"[Cache] 缓存更新完成: 总计 {len(cache_rows)} 个好友, 成功获取餐厅ID: {successful_count} 个 (账号ID: {account_id})")
+            # 直接返回刚写入的数据，调用方无需再查一次库
+            return [
+                {
+                    'id': row['friend_id'],
+                    'name': row['friend_name'],
+                    'level': row['friend_level'],
+                    'avatar': row['friend_avatar']
+                }
+                for row in cache_rows
+            ]
+
         except Exception as e:
             print(f"[Error] 更新好友缓存失败: {e}")
-            return False
+            return None
 
     def get_friends_with_cache(self, account_id: int, key: str, cookie: Optional[Dict[str, str]] = None, 
                              force_refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
@@ -177,13 +345,10 @@ class FriendCacheManager:
             fresh_friends = friend_action.get_all_friends()
             
             if fresh_friends:
-                # 更新缓存，传递key和cookie参数
-                cache_success = self.update_friends_cache(account_id, fresh_friends, key, cookie)
-                if cache_success:
-                    # 缓存更新成功后，重新从缓存获取（这样返回的是带有真正餐厅ID的数据）
-                    cached_friends = self.get_cached_friends(account_id)
-                    if cached_friends:
-                        return cached_friends
+                # 更新缓存，传递key和cookie参数；成功时返回的是带有真正餐厅ID的数据
+                refreshed = self.update_friends_cache(account_id, fresh_friends, key, cookie)
+                if refreshed:
+                    return refreshed
                 
                 # 如果缓存更新失败，返回原始数据
                 print(f"[Warning] 缓存更新失败，返回原始好友数据")
@@ -196,29 +361,19 @@ class FriendCacheManager:
             print(f"[Error] 获取好友列表时发生异常: {e}")
             return None
 
-    def refresh_all_accounts_friends_cache(self, account_manager) -> Dict[str, Any]:
+    def refresh_all_accounts_friends_cache(self, account_manager, force_refresh: bool = True,
+                                           max_age_hours: int = 24) -> Dict[str, Any]:
         """
         刷新所有账号的好友缓存
         :param account_manager: AccountManager实例
+        :param force_refresh: 是否强制刷新所有账号；定时任务等可传 False，跳过缓存仍有效的账号
+        :param max_age_hours: 缓存最大有效时间（小时），未超过的账号视为无需刷新
         :return: 刷新结果统计
         """
         print("[*] 开始刷新所有账号的好友缓存...")
         
-        accounts = account_manager.list_accounts()
-        
-        # 立即提取所有账号的属性避免会话分离问题
-        accounts_data = []
-        for account in accounts:
-            try:
-                account_data = {
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie
-                }
-                accounts_data.append(account_data)
-            except Exception as e:
-                print(f"[Warning] 提取账号 {getattr(account, 'username', '未知')} 属性失败: {e}")
+        # 一次查询取出账号常用列（AccountSnap 元组，无会话分离问题）
+        accounts_data = account_manager.list_accounts_bulk()
         
         results = {
             "total_accounts": len(accounts_data),
@@ -227,43 +382,79 @@ class FriendCacheManager:
             "account_details": []
         }
         
-        for account_data in accounts_data:
-            
-            if not account_data['key']:
-                print(f"[Skip] 账号 {account_data['username']} 没有Key，跳过")
-                continue
-                
-            print(f"[*] 刷新账号 {account_data['username']} 的好友缓存...")
-            cookie_dict = {"PHPSESSID": account_data['cookie']} if account_data['cookie'] else None
-            
-            friends = self.get_friends_with_cache(
-                account_id=account_data['id'],
-                key=account_data['key'],
+        def _refresh(account_data: AccountSnap):
+            print(f"[*] 刷新账号 {account_data.username} 的好友缓存...")
+            cookie_dict = {"PHPSESSID": account_data.cookie} if account_data.cookie else None
+            return self.get_friends_with_cache(
+                account_id=account_data.id,
+                key=account_data.key,
                 cookie=cookie_dict,
                 force_refresh=True
             )
-            
-            if friends:
-                results["successful_refreshes"] += 1
-                detail = {
-                    "account_name": account_data['username'],
-                    "friends_count": len(friends),
-                    "success": True,
-                    "message": f"成功缓存 {len(friends)} 个好友"
-                }
-                print(f"[Success] {account_data['username']}: 缓存了 {len(friends)} 个好友")
-            else:
-                results["failed_refreshes"] += 1
-                detail = {
-                    "account_name": account_data['username'],
-                    "friends_count": 0,
-                    "success": False,
-                    "message": "获取好友列表失败"
-                }
-                print(f"[Failed] {account_data['username']}: 获取好友列表失败")
-            
-            results["account_details"].append(detail)
-        
+
+        pending = []
+        for account_data in accounts_data:
+            if not account_data.key:
+                print(f"[Skip] 账号 {account_data.username} 没有Key，跳过")
+                continue
+            pending.append(account_data)
+
+        # 一次批量查询找出缓存仍有效的账号，直接计为成功，不再请求API
+        fresh_map = {} if force_refresh else self.get_cached_friends_bulk(
+            [a.id for a in pending], max_age_hours)
+        stale = []
+        for account_data in pending:
+            friends = fresh_map.get(account_data.id)
+            if not friends:
+                stale.append(account_data)
+                continue
+            results["successful_refreshes"] += 1
+            results["account_details"].append({
+                "account_name": account_data.username,
+                "friends_count": len(friends),
+                "success": True,
+                "message": f"缓存仍有效（{len(friends)} 个好友），跳过刷新"
+            })
+        if fresh_map:
+            print(f"[Cache] {len(pending) - len(stale)} 个账号缓存仍有效，跳过刷新")
+
+        # 各账号的key与数据库行互不相关，并发刷新；每次调用都会新建自己的数据库会话
+        # 结果统计只在主线程的 as_completed 循环中进行，无需额外加锁
+        with ThreadPoolExecutor(max_workers=ACCOUNT_REFRESH_WORKERS) as executor:
+            futures = {executor.submit(_refresh, a): a for a in stale}
+            for future in as_completed(futures):
+                account_data = futures[future]
+                try:
+                    friends = future.result()
+                except Exception as e:
+                    print(f"[Error] 刷新账号 {account_data.username} 时发生异常: {e}")
+                    friends = None
+
+                if friends:
+                    results["successful_refreshes"] += 1
+                    detail = {
+                        "account_name": account_data.username,
+                        "friends_count": len(friends),
+                        "success": True,
+                        "message": f"成功缓存 {len(friends)} 个好友"
+                    }
+                    print(f"[Success] {account_data.username}: 缓存了 {len(friends)} 个好友")
+                else:
+                    results["failed_refreshes"] += 1
+                    detail = {
+                        "account_name": account_data.username,
+                        "friends_count": 0,
+                        "success": False,
+                        "message": "获取好友列表失败"
+                    }
+                    print(f"[Failed] {account_data.username}: 获取好友列表失败")
+
+                results["account_details"].append(detail)
+
+        # 刷新结束后释放用户卡片缓存，避免长期占用内存
+        with self._card_lock:
+            self._card_cache.clear()
+
         # 输出统计结果
         success_rate = (results["successful_refreshes"] / results["total_accounts"] * 100) if results["total_accounts"] > 0 else 0
         
@@ -281,15 +472,18 @@ class FriendCacheManager:
         :param max_age_days: 缓存保留天数
         :return: 清理的记录数
         """
+        with self._mem_lock:
+            self._mem_generation += 1
+            self._mem_cache.clear()
+
+        cutoff_time = datetime.now() - timedelta(days=max_age_days)
         try:
             with self.get_db_session() as session:
-                cutoff_time = datetime.now() - timedelta(days=max_age_days)
-                
+                # 单条 DELETE ... WHERE，不需要同步会话内对象（会话中没有加载任何缓存对象）
                 deleted_count = session.query(FriendCache).filter(
                     FriendCache.last_updated < cutoff_time
-                ).delete()
+                ).delete(synchronize_session=False)
                 
-                session.commit()
                 print(f"[Cache] 清理了 {deleted_count} 条过期的好友缓存记录")
                 return deleted_count
                 
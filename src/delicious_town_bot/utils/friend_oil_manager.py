@@ -3,17 +3,23 @@
 好友添油管理器 - 专门用于管理账号间的循环添油功能
 """
 
-from typing import List, Dict, Any, Optional
+import logging
+from typing import List, Dict, Any, Optional, Tuple
 from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.log_setup import setup_logging
 from src.delicious_town_bot.actions.friend import FriendActions
 import time
 
+logger = logging.getLogger(__name__)
+
 
 class FriendOilManager:
     """好友添油管理器"""
     
     def __init__(self, account_manager: AccountManager):
         self.account_manager = account_manager
+        # 添油循环预览缓存：((账号ID, 用户名), ...) -> 对应关系列表
+        self._cycle_cache: Optional[Tuple[Tuple[Tuple[int, str], ...], List[Dict[str, str]]]] = None
     
     def collect_account_restaurant_ids(self, max_accounts: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -23,55 +29,31 @@ class FriendOilManager:
         """
         print("[*] 开始从数据库收集所有账号的餐厅ID...")
         
-        # 获取所有有Key的账号
-        all_accounts = self.account_manager.list_accounts()
-        valid_accounts = [acc for acc in all_accounts if acc.key]
-        
-        if max_accounts:
-            valid_accounts = valid_accounts[:max_accounts]
+        # 一次查询取出所有有Key的账号（在SQL中过滤和截断）
+        valid_accounts = self.account_manager.list_accounts_bulk(only_with_key=True, limit=max_accounts)
         
         print(f"[*] 找到 {len(valid_accounts)} 个有Key的账号")
         
         accounts_with_res_id = []
         
-        for i, account in enumerate(valid_accounts):
-            print(f"[*] [{i+1}/{len(valid_accounts)}] 获取 {account.username} 的餐厅ID...")
+        for i, (acc_id, username, key, cookie, restaurant) in enumerate(valid_accounts):
+            # 从数据库中的restaurant字段读取res_id
+            res_id = restaurant if restaurant and restaurant != 'None' else None
             
-            try:
-                # 从数据库中的restaurant字段读取res_id
-                res_id = account.restaurant if account.restaurant and account.restaurant != 'None' else None
-                
-                account_data = {
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie or '123',
-                    'restaurant': res_id,  # 保持原有字段名，确保兼容性
-                    'res_id': res_id
-                }
-                
-                if res_id:
-                    print(f"[Database] {account.username} 餐厅ID: {res_id}")
-                    accounts_with_res_id.append(account_data)
-                else:
-                    print(f"[Warning] {account.username} 数据库中缺少餐厅ID")
-                    # 仍然添加到列表，但res_id为None
-                    account_data['restaurant'] = None
-                    account_data['res_id'] = None
-                    accounts_with_res_id.append(account_data)
-                
-            except Exception as e:
-                print(f"[Error] 获取 {account.username} 餐厅ID失败: {e}")
-                # 添加失败的账号信息
-                accounts_with_res_id.append({
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie or '123',
-                    'restaurant': None,
-                    'res_id': None,
-                    'error': str(e)
-                })
+            if res_id:
+                logger.info("[%d/%d] %s 餐厅ID: %s", i + 1, len(valid_accounts), username, res_id)
+            else:
+                # 仍然添加到列表，但res_id为None
+                logger.warning("%s 数据库中缺少餐厅ID", username)
+            
+            accounts_with_res_id.append({
+                'id': acc_id,
+                'username': username,
+                'key': key,
+                'cookie': cookie or '123',
+                'restaurant': res_id,  # 保持原有字段名，确保兼容性
+                'res_id': res_id
+            })
         
         successful_count = sum(1 for acc in accounts_with_res_id if acc['res_id'])
         print(f"[Summary] 成功获取 {successful_count}/{len(accounts_with_res_id)} 个账号的餐厅ID")
@@ -117,26 +99,29 @@ class FriendOilManager:
         """
         print("[*] 预览添油循环顺序...")
         
-        all_accounts = self.account_manager.list_accounts()
-        valid_accounts = [acc for acc in all_accounts if acc.key]
-        
-        if max_accounts:
-            valid_accounts = valid_accounts[:max_accounts]
-        
-        # 按ID排序
-        sorted_accounts = sorted(valid_accounts, key=lambda x: x.id)
-        
-        cycle_pairs = []
-        for i, current_account in enumerate(sorted_accounts):
-            next_index = (i + 1) % len(sorted_accounts)
-            next_account = sorted_accounts[next_index]
-            
-            cycle_pairs.append({
-                'current_id': str(current_account.id),
-                'current_username': current_account.username,
-                'target_id': str(next_account.id),
-                'target_username': next_account.username
-            })
+        # 查询结果已按ID排序
+        sorted_accounts = [
+            (acc_id, username)
+            for acc_id, username, *_ in self.account_manager.list_accounts_bulk(only_with_key=True, limit=max_accounts)
+        ]
+        
+        # 账号集合未变化时直接复用上次计算的对应关系
+        cache_key = tuple(sorted_accounts)
+        if self._cycle_cache and self._cycle_cache[0] == cache_key:
+            cycle_pairs = self._cycle_cache[1]
+        else:
+            # 每个账号给下一个账号添油，最后一个给第一个
+            cycle_pairs = [
+                {
+                    'current_id': str(current_id),
+                    'current_username': current_name,
+                    'target_id': str(target_id),
+                    'target_username': target_name
+                }
+                for (current_id, current_name), (target_id, target_name)
+                in zip(sorted_accounts, sorted_accounts[1:] + sorted_accounts[:1])
+            ]
+            self._cycle_cache = (cache_key, cycle_pairs)
         
         print(f"[Preview] 添油循环顺序（共 {len(cycle_pairs)} 对）:")
         for i, pair in enumerate(cycle_pairs):
@@ -163,6 +148,7 @@ def quick_cycle_refill_oil(max_accounts: Optional[int] = None) -> Dict[str, Any]
 
 if __name__ == "__main__":
     # 测试脚本
+    setup_logging()
     account_manager = AccountManager()
     oil_manager = FriendOilManager(account_manager)
     
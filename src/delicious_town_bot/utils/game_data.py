@@ -1,6 +1,10 @@
-import json
 import functools
-from typing import Dict, Any, Optional
+import pickle
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+from src.delicious_town_bot.utils.json_io import read_json
 
 # 在Python 3.9+ 中，这是定位包内文件的标准方式
 try:
@@ -9,43 +13,83 @@ except ImportError:
     # Fallback for Python < 3.9
     import importlib_resources as pkg_resources
 
-# --- 私有变量，用于缓存处理后的数据 ---
+# --- 私有加载函数，结果由 lru_cache 缓存，只加载一次 ---
+
+FOOD_SNAPSHOT_NAME = 'foods.pkl'
+
+
+def _assets_dir():
+    # 'delicious_town_bot.assets' 是包含文件的模块/包路径
+    return pkg_resources.files('delicious_town_bot.assets')
+
+
+def _parse_food_json() -> Dict[str, Dict[str, Any]]:
+    """读取 foods.json，并将记录列表转换为以 code 为 key 的字典。"""
+    raw_data = read_json(_assets_dir().joinpath('foods.json'))
+    return {
+        record['code']: record
+        for record in raw_data.get("RECORDS", [])
+    }
+
+
+def _load_food_snapshot() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    读取预先生成的 foods.pkl 快照（见 scripts/build_food_snapshot.py），比解析 JSON 快得多。
+    快照不存在，或比 foods.json 旧（资源更新后未重新生成）时返回 None。
+    """
+    snapshot = _assets_dir().joinpath(FOOD_SNAPSHOT_NAME)
+    source = _assets_dir().joinpath('foods.json')
+    try:
+        if isinstance(snapshot, Path) and source.stat().st_mtime > snapshot.stat().st_mtime:
+            return None
+        with snapshot.open('rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
 
-# 将从JSON加载的数据处理成以 food_code 为键的字典，用于O(1)复杂度的快速查找
-_FOOD_DATA_MAP: Optional[Dict[str, Dict[str, Any]]] = None
+def write_food_snapshot() -> Path:
+    """将处理后的食材字典写入 assets/foods.pkl，返回写入路径。"""
+    path = Path(str(_assets_dir().joinpath(FOOD_SNAPSHOT_NAME)))
+    with path.open('wb') as f:
+        pickle.dump(_parse_food_json(), f, protocol=5)
+    return path
 
 
-def _load_food_data() -> Dict[str, Dict[str, Any]]:
+@functools.lru_cache(maxsize=1)
+def _load_food_data() -> Mapping[str, Dict[str, Any]]:
     """
-    加载并处理 foods.json 文件。
-    将记录列表转换为以 'code' 为键的字典，并缓存结果。
+    加载并处理 foods.json 文件（优先使用 foods.pkl 快照）。
+    将记录列表转换为以 'code' 为键的只读字典（O(1)查找），结果由 lru_cache 缓存。
     """
-    global _FOOD_DATA_MAP
-    if _FOOD_DATA_MAP is not None:
-        return _FOOD_DATA_MAP
+    processed_map = _load_food_snapshot()
+    if processed_map is not None:
+        return MappingProxyType(processed_map)
 
     print("[*] [GameData] 首次加载，正在读取并处理 foods.json...")
 
     # 使用 importlib.resources 安全地打开包内文件
     try:
-        # 'delicious_town_bot.assets' 是包含文件的模块/包路径
-        file_path = pkg_resources.files('delicious_town_bot.assets').joinpath('foods.json')
-        with file_path.open('r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+        processed_map = _parse_food_json()
     except FileNotFoundError:
         print("[Fatal] [GameData] 无法找到 foods.json 文件！")
-        _FOOD_DATA_MAP = {}
-        return _FOOD_DATA_MAP
+        return MappingProxyType({})
+
+    print(f"[*] [GameData] foods.json 加载并处理完成，共载入 {len(processed_map)} 条记录。")
+    # 只读视图，防止调用方意外修改共享的缓存数据
+    return MappingProxyType(processed_map)
 
-    # 将列表转换为以 code 为 key 的字典
-    processed_map = {
-        record['code']: record
-        for record in raw_data.get("RECORDS", [])
-    }
 
-    _FOOD_DATA_MAP = processed_map
-    print(f"[*] [GameData] foods.json 加载并处理完成，共载入 {len(_FOOD_DATA_MAP)} 条记录。")
-    return _FOOD_DATA_MAP
+@functools.lru_cache(maxsize=1)
+def _load_level_map() -> Mapping[str, int]:
+    """
+    预先计算 code -> 等级(int) 的映射，get_level_by_code 只需一次字典查找，无需每次 int() 转换。
+    """
+    return MappingProxyType({
+        code: int(record['level'])
+        for code, record in _load_food_data().items()
+        if 'level' in record
+    })
 
 
 # --- 公共查询接口 ---
@@ -57,8 +101,7 @@ def get_food_by_code(code: str) -> Optional[Dict[str, Any]]:
     :param code: 食材的 'code'。
     :return: 包含食材所有信息的字典，如果未找到则返回 None。
     """
-    data_map = _load_food_data()
-    return data_map.get(code)
+    return _load_food_data().get(code)
 
 
 def get_level_by_code(code: str) -> Optional[int]:
@@ -68,7 +111,4 @@ def get_level_by_code(code: str) -> Optional[int]:
     :param code: 食材的 'code'。
     :return: 食材的等级（整数），如果未找到则返回 None。
     """
-    food_info = get_food_by_code(code)
-    if food_info and 'level' in food_info:
-        return int(food_info['level'])
-    return None
\ No newline at end of file
+    return _load_level_map().get(code)
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""
+HTTP 连接池
+- SHARED_ADAPTER: 进程内所有 requests 会话共用的连接池适配器，复用 keep-alive 连接，避免每个账号重新建立TCP连接
+"""
+from requests.adapters import HTTPAdapter
+
+# 所有会话共用的连接池；重试由上层业务逻辑负责，保持 requests 默认的不自动重试（读超时仍抛 ReadTimeout）
+SHARED_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32)
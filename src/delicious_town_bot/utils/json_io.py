@@ -0,0 +1,21 @@
+"""
+JSON 文件读取工具
+- read_json: 优先使用 orjson 直接解析字节（无需先解码为 str），未安装时回退到标准库 json
+"""
+import json
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+def read_json(path: Union[str, Path]) -> Any:
+    """读取并解析 UTF-8 编码的 JSON 文件（也接受 importlib.resources 返回的 Traversable）。"""
+    if not hasattr(path, "read_bytes"):
+        path = Path(path)
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
@@ -0,0 +1,37 @@
+"""
+日志配置
+- setup_logging: 在程序入口调用一次。根日志器挂 QueueHandler，由后台 QueueListener 线程统一输出到标准输出，
+  并发工作线程记录日志时只入队，不会因终端输出互相阻塞
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+# 日志输出格式：保持与原先 print 输出相近，只多一个级别前缀
+LOG_FORMAT = "[%(levelname)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """
+    配置根日志器，重复调用不会重复添加处理器
+    :param level: 根日志器级别，默认 INFO（逐账号进度可见，逐条调试明细不输出）
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    # 退出前把队列中剩余的日志输出完
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
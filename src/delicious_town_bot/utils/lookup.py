@@ -0,0 +1,13 @@
+"""
+账号查找工具
+- by_username: 一次查询所有账号，构建 username → Account 的字典，供 O(1) 查找
+"""
+from typing import Dict
+
+from src.delicious_town_bot.db.models import Account
+from src.delicious_town_bot.utils.account_manager import AccountManager
+
+
+def by_username(mgr: AccountManager) -> Dict[str, Account]:
+    """返回以 username 为键的账号字典，替代对 list_accounts() 的反复线性扫描。"""
+    return {a.username: a for a in mgr.list_accounts()}
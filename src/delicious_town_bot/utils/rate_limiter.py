@@ -0,0 +1,59 @@
+"""
+线程安全的限速工具
+- RateLimiter: 保证相邻两次放行之间至少间隔 1/rate 秒，供线程池并发请求共享
+- AdaptiveRateLimiter: 在 RateLimiter 基础上按请求结果加性增/乘性减调整速率
+- backoff_delay: 带随机抖动的指数退避时长，用于失败重试
+"""
+import random
+import threading
+import time
+
+
+def backoff_delay(attempt: int, base: float = 0.25, cap: float = 8.0, jitter: float = 0.25) -> float:
+    """第 attempt 次（从 1 开始）失败后的等待秒数：min(cap, base * 2^(attempt-1)) + [0, jitter) 随机抖动。"""
+    return min(cap, base * (2 ** (attempt - 1))) + random.uniform(0, jitter)
+
+
+class RateLimiter:
+    """简单的线程安全限速器：保证相邻两次放行之间至少间隔 1/rate 秒。"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def acquire(self):
+        # 只在锁内预约时间片，睡眠放在锁外，避免其他线程排队等锁
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    自适应限速器（AIMD）：服务器出错时 penalize() 将速率减半（不低于 min_rate），
+    请求成功时 reward() 每次加 step，逐步恢复到初始速率。
+    """
+
+    def __init__(self, rate: float, min_rate: float = 1.0, step: float = 0.5):
+        super().__init__(rate)
+        self.rate = self.max_rate = rate
+        self.min_rate = min_rate
+        self.step = step
+
+    def _set_rate(self, rate: float):
+        # 调用方需持有 self._lock
+        self.rate = rate
+        self.interval = 1.0 / rate
+
+    def penalize(self):
+        with self._lock:
+            self._set_rate(max(self.min_rate, self.rate / 2))
+
+    def reward(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._set_rate(min(self.max_rate, self.rate + self.step))
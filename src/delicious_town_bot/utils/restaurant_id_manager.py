@@ -2,9 +2,22 @@
 餐厅ID管理器
 专门用于获取和管理账号的res_id（餐厅ID），避免重复API调用
 """
-from typing import List, Dict, Any, Optional
-from src.delicious_town_bot.utils.account_manager import AccountManager
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from src.delicious_town_bot.utils.account_manager import AccountManager, AccountSnap
 from src.delicious_town_bot.actions.user_card import UserCardAction
+from src.delicious_town_bot.utils.http_pool import SHARED_ADAPTER
+from src.delicious_town_bot.actions.base_action import NETWORK_FAILURE_MARK
+from src.delicious_town_bot.utils.rate_limiter import AdaptiveRateLimiter
+from src.delicious_town_bot.utils.log_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# 批量获取餐厅ID时的并发线程数与每秒最大请求数
+RESTAURANT_ID_WORKERS = 8
+RESTAURANT_ID_MAX_RPS = 3
 
 
 class RestaurantIdManager:
@@ -12,6 +25,18 @@ class RestaurantIdManager:
     
     def __init__(self):
         self.account_manager = AccountManager()
+        # 每个工作线程复用一个 UserCardAction，处理下一个账号时只切换凭据
+        self._local = threading.local()
+    
+    def _user_card_action(self, key: str, cookie_dict: Dict[str, str]) -> UserCardAction:
+        action = getattr(self._local, 'user_card_action', None)
+        if action is None:
+            # 复用共享长连接池，避免每个账号重新建立TCP连接
+            action = UserCardAction(key=key, cookie=cookie_dict, adapter=SHARED_ADAPTER)
+            self._local.user_card_action = action
+        else:
+            action.set_credentials(key, cookie_dict)
+        return action
     
     def get_account_restaurant_id(self, account_id: int, key: str, cookie: str) -> Optional[Dict[str, Any]]:
         """
@@ -23,9 +48,9 @@ class RestaurantIdManager:
         """
         try:
             cookie_dict = {"PHPSESSID": cookie}
-            user_card_action = UserCardAction(key=key, cookie=cookie_dict)
+            user_card_action = self._user_card_action(key, cookie_dict)
             
-            print(f"[*] 正在获取账号ID {account_id} 的餐厅信息...")
+            logger.debug("正在获取账号ID %s 的餐厅信息...", account_id)
             card_info = user_card_action.get_user_card('')
             
             if card_info.get('success'):
@@ -37,13 +62,43 @@ class RestaurantIdManager:
                     'success': True
                 }
             else:
-                print(f"[Error] 获取账号ID {account_id} 餐厅信息失败: {card_info.get('message')}")
+                logger.warning("获取账号ID %s 餐厅信息失败: %s", account_id, card_info.get('message'))
                 return {'success': False, 'error': card_info.get('message')}
                 
         except Exception as e:
-            print(f"[Error] 获取账号ID {account_id} 餐厅信息异常: {e}")
+            logger.error("获取账号ID %s 餐厅信息异常: %s", account_id, e)
             return {'success': False, 'error': str(e)}
     
+    def iter_restaurant_ids(self, accounts: List[AccountSnap]) -> Iterator[Tuple[AccountSnap, Optional[Dict[str, Any]]]]:
+        """
+        并发获取各账号的餐厅信息，按完成顺序逐个产出 (账号行, 餐厅信息)
+        :param accounts: list_accounts_bulk 返回的 AccountSnap 列表
+        :return: 生成器；没有Key的账号餐厅信息为None。提前停止迭代时取消尚未开始的请求
+        """
+        # 共享限速器控制总请求速率
+        limiter = AdaptiveRateLimiter(rate=RESTAURANT_ID_MAX_RPS)
+
+        def _fetch(account) -> Optional[Dict[str, Any]]:
+            if not account.key:
+                return None
+            limiter.acquire()
+            restaurant_info = self.get_account_restaurant_id(account.id, account.key, account.cookie)
+            # 网络层失败（限流/5xx 重试耗尽）时降速，成功时逐步恢复
+            if restaurant_info.get('success'):
+                limiter.reward()
+            elif NETWORK_FAILURE_MARK in str(restaurant_info.get('error', '')):
+                limiter.penalize()
+            return restaurant_info
+
+        with ThreadPoolExecutor(max_workers=RESTAURANT_ID_WORKERS) as executor:
+            futures = {executor.submit(_fetch, account): account for account in accounts}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    
     def batch_update_restaurant_ids(self, max_accounts: int = None) -> Dict[str, Any]:
         """
         批量更新所有账号的餐厅ID到数据库
@@ -52,25 +107,8 @@ class RestaurantIdManager:
         """
         print("[*] 开始批量更新账号餐厅ID...")
         
-        # 获取所有账号
-        accounts = self.account_manager.list_accounts()
-        if max_accounts:
-            accounts = accounts[:max_accounts]
-        
-        # 立即提取账号属性避免会话分离问题
-        accounts_data = []
-        for account in accounts:
-            try:
-                account_data = {
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie,
-                    'current_restaurant': account.restaurant
-                }
-                accounts_data.append(account_data)
-            except Exception as e:
-                print(f"[Warning] 提取账号属性失败: {e}")
+        # 一次查询取出账号常用列（AccountSnap 元组，无会话分离问题）
+        accounts_data = self.account_manager.list_accounts_bulk(limit=max_accounts)
         
         results = {
             "total_accounts": len(accounts_data),
@@ -80,16 +118,15 @@ class RestaurantIdManager:
             "account_details": []
         }
         
-        for i, account_data in enumerate(accounts_data):
-            username = account_data['username']
-            account_id = account_data['id']
-            key = account_data['key']
-            cookie = account_data['cookie']
+        updates = []
+        updated_details = []
+        # 边获取边汇总，不等整批请求完成
+        for i, (account, restaurant_info) in enumerate(self.iter_restaurant_ids(accounts_data)):
+            username = account.username
+            account_id = account.id
             
-            print(f"[*] [{i+1}/{len(accounts_data)}] 处理账号: {username}")
-            
-            if not key:
-                print(f"[Skip] 账号 {username} 没有Key，跳过")
+            if not account.key:
+                logger.info("账号 %s 没有Key，跳过", username)
                 results["skipped_accounts"] += 1
                 results["account_details"].append({
                     "username": username,
@@ -99,77 +136,59 @@ class RestaurantIdManager:
                 })
                 continue
             
-            # 获取餐厅ID
-            restaurant_info = self.get_account_restaurant_id(account_id, key, cookie)
-            
             if restaurant_info and restaurant_info.get('success'):
                 res_id = restaurant_info['res_id']
                 res_name = restaurant_info['res_name']
                 
-                # 更新数据库
-                try:
-                    self.account_manager.update_account(
-                        account_id=account_id,
-                        restaurant=str(res_id)  # 存储数字格式的res_id
-                    )
-                    success = True
-                    
-                    if success:
-                        results["successful_updates"] += 1
-                        print(f"[Success] {username}: 餐厅ID={res_id}, 名称={res_name}")
-                        results["account_details"].append({
-                            "username": username,
-                            "success": True,
-                            "message": f"餐厅ID={res_id}, 名称={res_name}",
-                            "res_id": res_id,
-                            "res_name": res_name
-                        })
-                    else:
-                        results["failed_updates"] += 1
-                        print(f"[Error] {username}: 数据库更新失败")
-                        results["account_details"].append({
-                            "username": username,
-                            "success": False,
-                            "message": "数据库更新失败",
-                            "res_id": res_id
-                        })
-                        
-                except Exception as e:
-                    results["failed_updates"] += 1
-                    print(f"[Error] {username}: 数据库更新异常 - {e}")
-                    results["account_details"].append({
-                        "username": username,
-                        "success": False,
-                        "message": f"数据库更新异常: {e}",
-                        "res_id": res_id
-                    })
+                # 先收集，循环结束后一次性写库
+                updates.append({"id": account_id, "restaurant": str(res_id)})  # 存储数字格式的res_id
+                logger.info("[%d/%d] %s: 餐厅ID=%s, 名称=%s", i + 1, len(accounts_data), username, res_id, res_name)
+                detail = {
+                    "username": username,
+                    "success": True,
+                    "message": f"餐厅ID={res_id}, 名称={res_name}",
+                    "res_id": res_id,
+                    "res_name": res_name
+                }
+                updated_details.append(detail)
+                results["account_details"].append(detail)
             else:
                 results["failed_updates"] += 1
                 error_msg = restaurant_info.get('error', '未知错误') if restaurant_info else '获取餐厅信息失败'
-                print(f"[Failed] {username}: {error_msg}")
+                logger.warning("%s: %s", username, error_msg)
                 results["account_details"].append({
                     "username": username,
                     "success": False,
                     "message": error_msg,
                     "res_id": None
                 })
-            
-            # 避免请求过快
-            if i < len(accounts_data) - 1:
-                import time
-                time.sleep(0.3)
+        
+        # 所有成功获取的餐厅ID一次性批量写入数据库
+        if updates:
+            try:
+                self.account_manager.bulk_update_accounts(updates)
+                results["successful_updates"] += len(updates)
+            except Exception as e:
+                results["failed_updates"] += len(updates)
+                print(f"[Error] 批量写入餐厅ID异常 - {e}")
+                for detail in updated_details:
+                    detail["success"] = False
+                    detail["message"] = f"数据库更新异常: {e}"
         
         # 生成统计报告
         success_rate = (results["successful_updates"] / results["total_accounts"] * 100) if results["total_accounts"] > 0 else 0
         
-        print(f"\n{'='*60}")
-        print(f"📊 餐厅ID批量更新完成:")
-        print(f"  总账号数: {results['total_accounts']}")
-        print(f"  成功更新: {results['successful_updates']}")
-        print(f"  更新失败: {results['failed_updates']}")
-        print(f"  跳过账号: {results['skipped_accounts']}")
-        print(f"  成功率: {success_rate:.1f}%")
-        print(f"{'='*60}")
+        # 汇总报告拼成一个字符串，一次输出
+        print("\n".join([
+            f"\n{'='*60}",
+            "📊 餐厅ID批量更新完成:",
+            f"  总账号数: {results['total_accounts']}",
+            f"  成功更新: {results['successful_updates']}",
+            f"  更新失败: {results['failed_updates']}",
+            f"  跳过账号: {results['skipped_accounts']}",
+            f"  成功率: {success_rate:.1f}%",
+            f"{'='*60}",
+        ]))
         
         results["success_rate"] = success_rate
         results["summary"] = f"更新完成: 成功{results['successful_updates']}个, 失败{results['failed_updates']}个, 成功率{success_rate:.1f}%"
@@ -182,33 +201,24 @@ class RestaurantIdManager:
         :param max_accounts: 最大账号数
         :return: 包含餐厅ID的账号列表
         """
-        accounts = self.account_manager.list_accounts()
-        if max_accounts:
-            accounts = accounts[:max_accounts]
-        
-        accounts_with_res_id = []
-        for account in accounts:
-            try:
-                account_data = {
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie,
-                    'res_id': account.restaurant,  # 从数据库读取res_id
-                    'has_res_id': bool(account.restaurant)
-                }
-                accounts_with_res_id.append(account_data)
-            except Exception as e:
-                print(f"[Warning] 提取账号 {getattr(account, 'username', '未知')} 信息失败: {e}")
-        
-        return accounts_with_res_id
+        return [
+            {
+                'id': acc_id,
+                'username': username,
+                'key': key,
+                'cookie': cookie,
+                'res_id': restaurant,  # 从数据库读取res_id
+                'has_res_id': bool(restaurant)
+            }
+            for acc_id, username, key, cookie, restaurant in self.account_manager.list_accounts_bulk(limit=max_accounts)
+        ]
     
     def check_accounts_restaurant_ids(self) -> Dict[str, Any]:
         """
         检查所有账号的餐厅ID状态
         :return: 检查结果统计
         """
-        accounts = self.account_manager.list_accounts()
+        accounts = self.account_manager.list_accounts_bulk()
         
         results = {
             "total_accounts": len(accounts),
@@ -218,24 +228,19 @@ class RestaurantIdManager:
         }
         
         for account in accounts:
-            try:
-                username = account.username
-                res_id = account.restaurant
-                has_res_id = bool(res_id)
-                
-                if has_res_id:
-                    results["accounts_with_res_id"] += 1
-                else:
-                    results["accounts_without_res_id"] += 1
-                
-                results["account_details"].append({
-                    "username": username,
-                    "res_id": res_id,
-                    "has_res_id": has_res_id
-                })
-                
-            except Exception as e:
-                print(f"[Warning] 检查账号信息失败: {e}")
+            res_id = account.restaurant
+            has_res_id = bool(res_id)
+            
+            if has_res_id:
+                results["accounts_with_res_id"] += 1
+            else:
+                results["accounts_without_res_id"] += 1
+            
+            results["account_details"].append({
+                "username": account.username,
+                "res_id": res_id,
+                "has_res_id": has_res_id
+            })
         
         return results
 
@@ -244,6 +249,7 @@ class RestaurantIdManager:
 #  独立测试脚本
 # ==============================================================================
 if __name__ == '__main__':
+    setup_logging()
     manager = RestaurantIdManager()
     
     print("=" * 20 + " 餐厅ID管理器测试 " + "=" * 20)
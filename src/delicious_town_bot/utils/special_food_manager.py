@@ -2,13 +2,30 @@
 特价菜任务管理器
 专门用于管理每日特价菜购买任务的状态追踪和批量执行
 """
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from contextlib import contextmanager
-from src.delicious_town_bot.db.session import DBSession
+from sqlalchemy import select, update
+from src.delicious_town_bot.db.session import DBSession, engine, upsert_insert
 from src.delicious_town_bot.db.models import SpecialFoodTask, Account
-from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.account_manager import AccountManager, AccountSnap
 from src.delicious_town_bot.actions.food import FoodActions
+from src.delicious_town_bot.utils.http_pool import SHARED_ADAPTER
+from src.delicious_town_bot.actions.base_action import NETWORK_FAILURE_MARK
+from src.delicious_town_bot.utils.rate_limiter import AdaptiveRateLimiter
+from src.delicious_town_bot.utils.log_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# 批量购买特价菜时的并发线程数与每秒最大请求数（特价菜接口间隔稍长一些）
+SPECIAL_FOOD_WORKERS = 3
+SPECIAL_FOOD_MAX_RPS = 1
+
+# buy_special_food_for_account 未传入预查询状态时的占位值
+_NOT_FETCHED = object()
 
 
 class SpecialFoodManager:
@@ -16,6 +33,18 @@ class SpecialFoodManager:
     
     def __init__(self):
         self.account_manager = AccountManager()
+        # 每个工作线程复用一个 FoodActions，处理下一个账号时只切换凭据
+        self._local = threading.local()
+    
+    def _food_action(self, key: str, cookie_dict: Dict[str, str]) -> FoodActions:
+        action = getattr(self._local, 'food_action', None)
+        if action is None:
+            # 复用共享长连接池，避免每个账号重新建立TCP连接
+            action = FoodActions(key=key, cookie=cookie_dict, adapter=SHARED_ADAPTER)
+            self._local.food_action = action
+        else:
+            action.set_credentials(key, cookie_dict)
+        return action
     
     @contextmanager
     def get_db_session(self):
@@ -28,7 +57,8 @@ class SpecialFoodManager:
             session.rollback()
             raise e
         finally:
-            session.close()
+            # 连接归还连接池，线程池中的工作线程不残留会话
+            DBSession.remove()
     
     def get_today_task_status(self, account_id: int) -> Optional[SpecialFoodTask]:
         """
@@ -45,19 +75,38 @@ class SpecialFoodManager:
             
             if task:
                 # 立即提取任务属性避免session分离
-                return {
-                    'id': task.id,
-                    'account_id': task.account_id,
-                    'task_date': task.task_date,
-                    'completed': task.completed,
-                    'food_name': task.food_name,
-                    'quantity': task.quantity,
-                    'gold_spent': task.gold_spent,
-                    'completed_at': task.completed_at,
-                    'error_message': task.error_message
-                }
+                return self._task_to_dict(task)
             return None
     
+    def get_today_tasks(self) -> Dict[int, Dict[str, Any]]:
+        """
+        一次查询获取所有账号今日的特价菜任务记录
+        :return: {账号ID: 任务记录}
+        """
+        with self.get_db_session() as session:
+            return self._query_today_tasks(session)
+    
+    @classmethod
+    def _query_today_tasks(cls, session) -> Dict[int, Dict[str, Any]]:
+        tasks = session.query(SpecialFoodTask).filter(
+            SpecialFoodTask.task_date == date.today()
+        )
+        return {task.account_id: cls._task_to_dict(task) for task in tasks}
+    
+    @staticmethod
+    def _task_to_dict(task: SpecialFoodTask) -> Dict[str, Any]:
+        return {
+            'id': task.id,
+            'account_id': task.account_id,
+            'task_date': task.task_date,
+            'completed': task.completed,
+            'food_name': task.food_name,
+            'quantity': task.quantity,
+            'gold_spent': task.gold_spent,
+            'completed_at': task.completed_at,
+            'error_message': task.error_message
+        }
+    
     def mark_task_completed(self, account_id: int, food_name: str, quantity: int, 
                           gold_spent: int) -> bool:
         """
@@ -68,40 +117,17 @@ class SpecialFoodManager:
         :param gold_spent: 花费金币
         :return: 是否成功
         """
-        today = date.today()
-        now = datetime.now()
-        
         try:
-            with self.get_db_session() as session:
-                # 查找今日任务记录
-                task = session.query(SpecialFoodTask).filter(
-                    SpecialFoodTask.account_id == account_id,
-                    SpecialFoodTask.task_date == today
-                ).first()
-                
-                if task:
-                    # 更新现有记录
-                    task.completed = True
-                    task.food_name = food_name
-                    task.quantity = quantity
-                    task.gold_spent = gold_spent
-                    task.completed_at = now
-                    task.error_message = None
-                else:
-                    # 创建新记录
-                    task = SpecialFoodTask(
-                        account_id=account_id,
-                        task_date=today,
-                        completed=True,
-                        food_name=food_name,
-                        quantity=quantity,
-                        gold_spent=gold_spent,
-                        completed_at=now
-                    )
-                    session.add(task)
-                
-                session.commit()
-                return True
+            self._upsert_today_tasks(
+                [account_id],
+                completed=True,
+                food_name=food_name,
+                quantity=quantity,
+                gold_spent=gold_spent,
+                completed_at=datetime.now(),
+                error_message=None
+            )
+            return True
                 
         except Exception as e:
             print(f"[Error] 标记特价菜任务完成失败: {e}")
@@ -114,35 +140,59 @@ class SpecialFoodManager:
         :param error_message: 错误信息
         :return: 是否成功
         """
+        try:
+            self._upsert_today_tasks([account_id], completed=False, error_message=error_message)
+            return True
+                
+        except Exception as e:
+            print(f"[Error] 标记特价菜任务失败失败: {e}")
+            return False
+    
+    @staticmethod
+    def _upsert_today_tasks(account_ids: List[int], **fields):
+        """
+        写入多个账号的今日任务记录（各账号字段值相同）：存在则更新 fields，不存在则插入。
+        直接用 Core 语句在一个事务里执行，不经过 ORM 会话与对象实例化；
+        SQLite/PostgreSQL 用 INSERT ... ON CONFLICT 的 executemany 完成，
+        其他数据库回退为一次 IN 查询后批量 UPDATE 已有记录、executemany INSERT 缺失记录。
+        """
         today = date.today()
+        table = SpecialFoodTask.__table__
+        rows = [{'account_id': account_id, 'task_date': today, **fields} for account_id in account_ids]
+        with engine.begin() as conn:
+            dialect_insert = upsert_insert(conn)
+            if dialect_insert is not None:
+                stmt = dialect_insert(table)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=['account_id', 'task_date'],
+                    set_={name: stmt.excluded[name] for name in fields}
+                ), rows)
+                return
+            
+            today_filter = (table.c.account_id.in_(account_ids), table.c.task_date == today)
+            existing = set(conn.execute(select(table.c.account_id).where(*today_filter)).scalars())
+            if existing:
+                conn.execute(update(table).where(*today_filter).values(**fields))
+            missing = [row for row in rows if row['account_id'] not in existing]
+            if missing:
+                conn.execute(table.insert(), missing)
+    
+    def mark_tasks_failed(self, account_ids: List[int], error_message: str) -> bool:
+        """
+        批量标记多个账号的今日特价菜任务为失败（单个事务）
+        :param account_ids: 账号ID列表
+        :param error_message: 错误信息
+        :return: 是否成功
+        """
+        if not account_ids:
+            return True
         
         try:
-            with self.get_db_session() as session:
-                # 查找今日任务记录
-                task = session.query(SpecialFoodTask).filter(
-                    SpecialFoodTask.account_id == account_id,
-                    SpecialFoodTask.task_date == today
-                ).first()
-                
-                if task:
-                    # 更新现有记录
-                    task.completed = False
-                    task.error_message = error_message
-                else:
-                    # 创建新记录
-                    task = SpecialFoodTask(
-                        account_id=account_id,
-                        task_date=today,
-                        completed=False,
-                        error_message=error_message
-                    )
-                    session.add(task)
-                
-                session.commit()
-                return True
+            self._upsert_today_tasks(account_ids, completed=False, error_message=error_message)
+            return True
                 
         except Exception as e:
-            print(f"[Error] 标记特价菜任务失败失败: {e}")
+            print(f"[Error] 批量标记特价菜任务失败失败: {e}")
             return False
     
     def get_all_accounts_task_status(self) -> Dict[str, Any]:
@@ -150,29 +200,13 @@ class SpecialFoodManager:
         获取所有账号今日的特价菜任务状态
         :return: 任务状态统计
         """
-        today = date.today()
-        
         try:
             with self.get_db_session() as session:
-                # 获取所有账号
-                accounts = session.query(Account).all()
+                # 获取所有账号（只取需要的列）
+                accounts = session.query(Account.id, Account.username, Account.key).all()
                 
-                # 获取今日所有任务记录
-                tasks = session.query(SpecialFoodTask).filter(
-                    SpecialFoodTask.task_date == today
-                ).all()
-                
-                # 创建任务字典，便于查找
-                task_dict = {}
-                for task in tasks:
-                    task_dict[task.account_id] = {
-                        'completed': task.completed,
-                        'food_name': task.food_name,
-                        'quantity': task.quantity,
-                        'gold_spent': task.gold_spent,
-                        'completed_at': task.completed_at,
-                        'error_message': task.error_message
-                    }
+                # 获取今日所有任务记录，按账号ID建字典便于查找
+                task_dict = self._query_today_tasks(session)
                 
                 # 统计结果
                 results = {
@@ -212,7 +246,8 @@ class SpecialFoodManager:
             return {'error': str(e)}
     
     def buy_special_food_for_account(self, account_id: int, key: str, cookie: str, 
-                                   quantity: int = 1, force: bool = False) -> Dict[str, Any]:
+                                   quantity: int = 1, force: bool = False,
+                                   existing_status: Any = _NOT_FETCHED) -> Dict[str, Any]:
         """
         为单个账号购买特价菜
         :param account_id: 账号ID
@@ -220,12 +255,16 @@ class SpecialFoodManager:
         :param cookie: 账号cookie
         :param quantity: 购买数量
         :param force: 是否强制购买（忽略已完成状态）
+        :param existing_status: 已预先查询的今日任务记录（没有记录时传None），提供时不再查库
         :return: 购买结果
         """
         try:
             # 检查今日是否已完成（除非强制购买）
             if not force:
-                task_status = self.get_today_task_status(account_id)
+                if existing_status is _NOT_FETCHED:
+                    task_status = self.get_today_task_status(account_id)
+                else:
+                    task_status = existing_status
                 if task_status and task_status.get('completed'):
                     return {
                         'success': False,
@@ -235,7 +274,7 @@ class SpecialFoodManager:
             
             # 创建FoodActions实例
             cookie_dict = {"PHPSESSID": cookie}
-            food_action = FoodActions(key=key, cookie=cookie_dict)
+            food_action = self._food_action(key, cookie_dict)
             
             # 购买特价菜
             success, result = food_action.buy_special_food(quantity=quantity)
@@ -280,33 +319,77 @@ class SpecialFoodManager:
                 'message': error_msg
             }
     
-    def batch_buy_special_food(self, max_accounts: int = None, quantity: int = 1) -> Dict[str, Any]:
+    def iter_special_food_purchases(self, accounts: List[AccountSnap], quantity: int = 1,
+                                    force: bool = False) -> Iterator[Tuple[AccountSnap, Optional[Dict[str, Any]]]]:
+        """
+        并发为各账号购买特价菜，按完成顺序逐个产出 (账号行, 购买结果)
+        :param accounts: list_accounts_bulk 返回的 AccountSnap 列表
+        :param quantity: 每个账号购买数量
+        :param force: 是否强制购买（忽略已完成状态）
+        :return: 生成器；没有Key或因售罄未购买的账号结果为None。提前停止迭代时取消尚未开始的购买
+        """
+        # 一次查询取出所有账号今日的任务状态，避免每个账号单独查库
+        today_tasks = self.get_today_tasks()
+
+        # 并发购买（共享限速器控制总请求速率）；一旦检测到售罄，尚未开始的账号不再购买
+        limiter = AdaptiveRateLimiter(rate=SPECIAL_FOOD_MAX_RPS, min_rate=0.25, step=0.25)
+        sold_out = threading.Event()
+
+        def _buy(account) -> Optional[Dict[str, Any]]:
+            if not account.key:
+                return None
+            # 今日已完成的账号直接跳过：不占用限速名额，不创建 FoodActions，不发请求
+            status = today_tasks.get(account.id)
+            if not force and status and status.get('completed'):
+                return {
+                    'success': False,
+                    'message': '今日特价菜任务已完成',
+                    'already_completed': True
+                }
+            if sold_out.is_set():
+                return None
+            limiter.acquire()
+            if sold_out.is_set():
+                return None
+            purchase_result = self.buy_special_food_for_account(
+                account.id, account.key, account.cookie, quantity,
+                force=force, existing_status=status
+            )
+            if purchase_result.get('is_sold_out'):
+                sold_out.set()
+            # 网络层失败时降速，成功时逐步恢复
+            if purchase_result.get('success'):
+                limiter.reward()
+            elif NETWORK_FAILURE_MARK in purchase_result.get('message', ''):
+                limiter.penalize()
+            return purchase_result
+
+        with ThreadPoolExecutor(max_workers=SPECIAL_FOOD_WORKERS) as executor:
+            futures = {executor.submit(_buy, account): account for account in accounts}
+            try:
+                for future in as_completed(futures):
+                    if sold_out.is_set():
+                        # 已售罄：尚未开始的购买直接取消
+                        for pending in futures:
+                            pending.cancel()
+                    yield futures[future], None if future.cancelled() else future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def batch_buy_special_food(self, max_accounts: int = None, quantity: int = 1,
+                               force: bool = False) -> Dict[str, Any]:
         """
         批量为所有账号购买特价菜
         :param max_accounts: 最大处理账号数
         :param quantity: 每个账号购买数量
+        :param force: 是否强制购买（忽略已完成状态）
         :return: 批量购买结果
         """
         print(f"[*] 开始批量购买特价菜，每个账号购买 {quantity} 个...")
         
-        # 获取账号列表
-        accounts = self.account_manager.list_accounts()
-        if max_accounts:
-            accounts = accounts[:max_accounts]
-        
-        # 立即提取账号属性避免会话分离
-        accounts_data = []
-        for account in accounts:
-            try:
-                account_data = {
-                    'id': account.id,
-                    'username': account.username,
-                    'key': account.key,
-                    'cookie': account.cookie
-                }
-                accounts_data.append(account_data)
-            except Exception as e:
-                print(f"[Warning] 提取账号 {getattr(account, 'username', '未知')} 属性失败: {e}")
+        # 一次查询取出账号常用列（AccountSnap 元组，无会话分离问题）
+        accounts_data = self.account_manager.list_accounts_bulk(limit=max_accounts)
         
         results = {
             "total_accounts": len(accounts_data),
@@ -318,16 +401,14 @@ class SpecialFoodManager:
             "account_details": []
         }
         
-        for i, account_data in enumerate(accounts_data):
-            username = account_data['username']
-            account_id = account_data['id']
-            key = account_data['key']
-            cookie = account_data['cookie']
+        # 边购买边汇总，不等整批请求完成
+        sold_out_ids = []
+        purchases = self.iter_special_food_purchases(accounts_data, quantity, force=force)
+        for i, (account, purchase_result) in enumerate(purchases):
+            username = account.username
             
-            print(f"[*] [{i+1}/{len(accounts_data)}] 处理账号: {username}")
-            
-            if not key:
-                print(f"[Skip] 账号 {username} 没有Key，跳过")
+            if not account.key:
+                logger.info("账号 %s 没有Key，跳过", username)
                 results["account_details"].append({
                     "username": username,
                     "success": False,
@@ -336,35 +417,27 @@ class SpecialFoodManager:
                 })
                 continue
             
-            results["processed_accounts"] += 1
+            if purchase_result is None:
+                # 售罄后未执行购买的账号，循环结束后统一标记失败
+                sold_out_ids.append(account.id)
+                continue
             
-            # 购买特价菜
-            purchase_result = self.buy_special_food_for_account(
-                account_id, key, cookie, quantity
-            )
+            results["processed_accounts"] += 1
             
             if purchase_result.get('success'):
                 results["successful_purchases"] += 1
-                print(f"[Success] {username}: {purchase_result['message']}")
+                logger.info("[%d/%d] %s: %s", i + 1, len(accounts_data), username, purchase_result['message'])
             elif purchase_result.get('already_completed'):
                 results["already_completed"] += 1
-                print(f"[Skip] {username}: 今日特价菜任务已完成")
+                logger.info("%s: 今日特价菜任务已完成", username)
             else:
                 results["failed_purchases"] += 1
-                print(f"[Failed] {username}: {purchase_result['message']}")
+                logger.warning("%s: %s", username, purchase_result['message'])
                 
                 # 检查是否售罄
-                if purchase_result.get('is_sold_out'):
+                if purchase_result.get('is_sold_out') and not results["sold_out_detected"]:
                     results["sold_out_detected"] = True
                     print(f"[Info] 检测到特价菜已售罄，停止后续购买")
-                    # 为剩余账号标记失败
-                    for remaining_account in accounts_data[i+1:]:
-                        if remaining_account['key']:  # 只处理有Key的账号
-                            self.mark_task_failed(
-                                remaining_account['id'], 
-                                "特价菜已售罄"
-                            )
-                    break
             
             results["account_details"].append({
                 "username": username,
@@ -375,26 +448,27 @@ class SpecialFoodManager:
                 "quantity": purchase_result.get('quantity'),
                 "gold_spent": purchase_result.get('gold_spent')
             })
-            
-            # 避免请求过快，特价菜购买间隔稍长一些
-            if i < len(accounts_data) - 1:
-                import time
-                time.sleep(1)
+        
+        self.mark_tasks_failed(sold_out_ids, "特价菜已售罄")
         
         # 生成统计报告
         success_rate = (results["successful_purchases"] / results["processed_accounts"] * 100) if results["processed_accounts"] > 0 else 0
         
-        print(f"\n{'='*60}")
-        print(f"📊 特价菜批量购买完成:")
-        print(f"  总账号数: {results['total_accounts']}")
-        print(f"  处理账号: {results['processed_accounts']}")
-        print(f"  成功购买: {results['successful_purchases']}")
-        print(f"  购买失败: {results['failed_purchases']}")
-        print(f"  已完成: {results['already_completed']}")
-        print(f"  成功率: {success_rate:.1f}%")
+        # 汇总报告拼成一个字符串，一次输出
+        summary_lines = [
+            f"\n{'='*60}",
+            "📊 特价菜批量购买完成:",
+            f"  总账号数: {results['total_accounts']}",
+            f"  处理账号: {results['processed_accounts']}",
+            f"  成功购买: {results['successful_purchases']}",
+            f"  购买失败: {results['failed_purchases']}",
+            f"  已完成: {results['already_completed']}",
+            f"  成功率: {success_rate:.1f}%",
+        ]
         if results["sold_out_detected"]:
-            print(f"  ⚠️ 特价菜已售罄")
-        print(f"{'='*60}")
+            summary_lines.append("  ⚠️ 特价菜已售罄")
+        summary_lines.append(f"{'='*60}")
+        print("\n".join(summary_lines))
         
         results["success_rate"] = success_rate
         results["summary"] = f"购买完成: 成功{results['successful_purchases']}个, 失败{results['failed_purchases']}个, 已完成{results['already_completed']}个, 成功率{success_rate:.1f}%"
@@ -406,6 +480,7 @@ class SpecialFoodManager:
 #  独立测试脚本
 # ==============================================================================
 if __name__ == '__main__':
+    setup_logging()
     manager = SpecialFoodManager()
     
     print("=" * 20 + " 特价菜任务管理器测试 " + "=" * 20)
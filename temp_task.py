@@ -2,6 +2,11 @@ import re
 from src.delicious_town_bot.action.base_action import BaseAction, BusinessLogicError
 from typing import Tuple, Dict, Any, Union
 
+# 奖励解析用的正则，模块加载时编译一次
+_GOLD_RE = re.compile(r"金币:(\d+)")
+_EXP_RE = re.compile(r"经验:(\d+)")
+_ITEMS_RE = re.compile(r"获得物品:(.+)")
+
 
 class TaskActions(BaseAction):
     """封装所有与任务（Task）相关的游戏操作。"""
@@ -60,17 +65,17 @@ class TaskActions(BaseAction):
         rewards = {}
 
         # 使用正则表达式查找金币
-        gold_match = re.search(r"金币:(\d+)", msg)
+        gold_match = _GOLD_RE.search(msg)
         if gold_match:
             rewards['gold'] = int(gold_match.group(1))
 
         # 使用正则表达式查找经验
-        exp_match = re.search(r"经验:(\d+)", msg)
+        exp_match = _EXP_RE.search(msg)
         if exp_match:
             rewards['exp'] = int(exp_match.group(1))
 
         # 使用正则表达式查找物品
-        items_match = re.search(r"获得物品:(.+)", msg)
+        items_match = _ITEMS_RE.search(msg)
         if items_match:
             rewards['items'] = items_match.group(1).strip()
 
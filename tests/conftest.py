@@ -0,0 +1,43 @@
+# tests/conftest.py
+from pathlib import Path
+import pytest
+from src.delicious_town_bot.utils.account_manager import AccountManager
+from src.delicious_town_bot.utils.json_io import read_json
+
+# 初始账号配置文件路径，导入时计算一次
+INIT_ACCOUNTS_PATH = Path(__file__).resolve().parent.parent / "data" / "initial_accounts.json"
+
+
+@pytest.fixture(scope="session")
+def accounts_data():
+    """初始账号配置：整个测试会话只读取、解析一次"""
+    assert INIT_ACCOUNTS_PATH.exists(), f"初始账号配置文件未找到: {INIT_ACCOUNTS_PATH}"
+    data = read_json(INIT_ACCOUNTS_PATH)
+    assert isinstance(data, list) and data, "初始账号列表为空或格式不正确"
+    return data
+
+
+@pytest.fixture
+def mgr():
+    """每个测试一个内存数据库的 AccountManager，互不影响、不写磁盘，测试结束随实例释放"""
+    manager = AccountManager(db_url="sqlite://")
+    yield manager
+    manager.close()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--integration", action="store_true", default=False,
+                     help="运行需要真实登录游戏服务器的集成测试")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "integration: 需要访问游戏服务器的集成测试，默认跳过")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--integration"):
+        return
+    skip_integration = pytest.mark.skip(reason="集成测试默认跳过，使用 --integration 运行")
+    for item in items:
+        if "integration" in item.keywords:
+            item.add_marker(skip_integration)
@@ -1,37 +1,44 @@
 # tests/test_account_manager.py
-import json
-from pathlib import Path
+from unittest.mock import patch
 import pytest
 from src.delicious_town_bot.utils.account_manager import AccountManager, Account
 
-def test_refresh_first_account():
-    # 1. 读取初始账号配置
-    project_root = Path(__file__).parent.parent
-    init_path = project_root / "data" / "initial_accounts.json"
-    assert init_path.exists(), f"初始账号配置文件未找到: {init_path}"
-    accounts_data = json.loads(init_path.read_text(encoding="utf-8"))
-    assert isinstance(accounts_data, list) and accounts_data, "初始账号列表为空或格式不正确"
+FAKE_KEY = "deadbeef"
 
-    # 2. 初始化 AccountManager 并导入第一条账号
-    mgr = AccountManager()
+
+def _add_first_account(mgr, accounts_data):
+    # 1. 取第一条初始账号配置（由会话级 fixture 读取）
     first = accounts_data[0]
     username = first.get("username")
     password = first.get("password")
     assert username and password, "初始账号配置缺少 username/password"
 
-    # 尝试添加或更新该账号
-    try:
-        acc = mgr.add_account(username, password)
-    except ValueError:
-        acc_list = mgr.list_accounts()
-        acc = next((a for a in acc_list if a.username == username), None)
-        assert acc, f"账号 {username} 应存在于数据库"
-        mgr.update_account(acc.id, password=password)
+    # 2. 在独立的测试数据库中添加或更新该账号（单个事务，只提交一次）
+    with mgr.transaction():
+        try:
+            acc = mgr.add_account(username, password)
+        except ValueError:
+            acc = mgr.get_account_by_username(username)
+            assert acc, f"账号 {username} 应存在于数据库"
+            mgr.update_account(acc.id, password=password)
+    return acc
+
+
+def test_refresh_first_account(mgr, accounts_data):
+    acc = _add_first_account(mgr, accounts_data)
+
+    # 3. 刷新 key（登录请求被替换为固定返回值）并断言已写库
+    with patch("src.delicious_town_bot.utils.account_manager.do_login", return_value=FAKE_KEY) as mock_login:
+        key = mgr.refresh_key(acc.id)
+    mock_login.assert_called_once_with(acc.username, acc.password)
+    assert key == FAKE_KEY
+    assert mgr.get_account(acc.id).key == FAKE_KEY
 
-    # 3. 刷新 key 并断言返回值
+
+@pytest.mark.integration
+def test_refresh_first_account_live(mgr, accounts_data):
+    acc = _add_first_account(mgr, accounts_data)
+
+    # 3. 真实登录刷新 key 并断言返回值（网络请求放在事务之外）
     key = mgr.refresh_key(acc.id)
     assert isinstance(key, str) and key, "刷新 key 未返回有效字符串"
-
-    # 4. 清理环境（可选）：删除测试账号
-    mgr.delete_account(acc.id)
-    mgr.close()